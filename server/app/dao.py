@@ -1,208 +1,259 @@
 # server/app/dao.py
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, bindparam
-from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
+from sqlalchemy.orm import Session
+from sqlalchemy import text, event
 import json
+import time
 from app.services.armor import effective_armor_level, apply_armor_reduction
 from app.services.status_mods import get_status_combat_mods
 
 
+# ===================== DRIVER =====================
+async def _pg_fetch(session: AsyncSession, sql: str, *args):
+    """
+    Чтение напрямую через asyncpg-соединение сессии: conn.fetch() без компиляции
+    Core и обёрток RowMapping. Соединение и транзакция — те же, что у session;
+    json/jsonb декодирует кодек, который диалект ставит на соединение, uuid
+    приходит как uuid.UUID. Плейсхолдеры — $1, $2 …; prepared statements asyncpg
+    кэширует сам. Только для горячих чтений — записи идут через session.execute.
+    """
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    return await raw.driver_connection.fetch(sql, *args)
+
+
+async def _pg_fetchrow(session: AsyncSession, sql: str, *args):
+    """Как _pg_fetch, но одна строка (asyncpg Record) или None."""
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    return await raw.driver_connection.fetchrow(sql, *args)
+
+
 # ===================== NODE =====================
-async def fetch_node(session: AsyncSession, node_id: str):
-    # Берём размеры гибко: width/height или size_w/size_h (что есть в схеме)
-    node = (
-        await session.execute(
-            text(
-                """
-                SELECT
-                    id,
-                    title,
-                    biome,
-                    COALESCE(width, size_w, 16)  AS w,
-                    COALESCE(height, size_h, 16) AS h,
-                    exits,
-                    content,
-                    description
-                FROM nodes
-                WHERE id = :id
-                """
+# Один запрос на пачку узлов: готовая выдача узла (с актёрами, объектами и
+# фактами) собирается целиком в Postgres, Python её только декодирует.
+# Берём размеры гибко: width/height или size_w/size_h (что есть в схеме)
+_PG_NODES = """
+    SELECT
+        n.id,
+        json_build_object(
+            'id', n.id,
+            'title', n.title,
+            'biome', n.biome,
+            'size', json_build_object(
+                'w', COALESCE(n.width, n.size_w, 16)::int,
+                'h', COALESCE(n.height, n.size_h, 16)::int
             ),
-            {"id": node_id},
-        )
-    ).mappings().first()
+            -- актёры с координатами (x, y)
+            'actors', (
+                SELECT COALESCE(jsonb_agg(to_jsonb(x)), '[]'::jsonb)
+                FROM (
+                    SELECT id, kind, archtype, node_id, x, y, hp, mood, trust, aggression
+                    FROM actors
+                    WHERE node_id = n.id
+                ) x
+            ),
+            -- объекты (props/decoration) с координатами и слоем
+            'objects', (
+                SELECT COALESCE(jsonb_agg(to_jsonb(x) ORDER BY x.y, x.x, x.layer, x.id), '[]'::jsonb)
+                FROM (
+                    SELECT id, asset_id, x, y, rotation, props, layer
+                    FROM node_objects
+                    WHERE node_id = n.id
+                ) x
+            ),
+            'exits', n.exits,
+            -- факты
+            'facts', (
+                SELECT COALESCE(jsonb_object_agg(f.k, f.v), '{}'::jsonb)
+                FROM facts f
+                WHERE f.node_id = n.id
+            ),
+            'content', n.content,
+            'description', n.description
+        ) AS payload
+    FROM nodes n
+    WHERE n.id = ANY($1::text[])
+    """
+
+# Короткий кэш готовых узлов: node_id -> (expires_at, payload, json_bytes).
+# Узел читается намного чаще, чем меняется; любой commit сбрасывает кэш целиком
+# (актёры ходят между узлами, так что точечно не угадать), TTL страхует
+# от записей из других процессов. Отдаваемый dict общий — не мутировать.
+# json_bytes — тот же payload, сериализованный один раз (см. fetch_node_json).
+# _node_cache_gen растёт на каждом сбросе: чтение, начатое до чужого commit,
+# а законченное после, не должно положить в кэш старый снимок.
+_NODE_CACHE_TTL = 3.0
+_node_cache: Dict[str, Tuple[float, Dict[str, Any], Optional[bytes]]] = {}
+_node_cache_gen = 0
+
+
+def invalidate_node(node_id: Optional[str] = None) -> None:
+    """Сбрасывает кэш fetch_node для узла (или целиком, если node_id не задан)."""
+    global _node_cache_gen
+    _node_cache_gen += 1
+    if node_id is None:
+        _node_cache.clear()
+    else:
+        _node_cache.pop(node_id, None)
 
-    if not node:
-        return None
 
-    # exits может быть json/jsonb или текстом — нормализуем к dict
-    exits_raw = node.get("exits")
-    if exits_raw is None:
-        exits: Dict[str, Any] = {}
-    elif isinstance(exits_raw, dict):
-        exits = exits_raw
-    elif isinstance(exits_raw, str):
-        try:
-            parsed = json.loads(exits_raw)
-            exits = parsed if isinstance(parsed, dict) else {}
-        except Exception:
-            exits = {}
-    else:
-        exits = {}
+@event.listens_for(Session, "after_commit")
+def _invalidate_nodes_on_commit(_session) -> None:
+    invalidate_node()
 
-    # актёры с координатами (x, y)
-    actors = (
-        await session.execute(
-            text(
-                """
-                SELECT id, kind, archtype, node_id, x, y, hp, mood, trust, aggression
-                FROM actors
-                WHERE node_id = :id
-                """
-            ),
-            {"id": node_id},
-        )
-    ).mappings().all()
 
-    # объекты (props/decoration) с координатами и слоем
-    objects = (
-        await session.execute(
-            text(
-                """
-                SELECT id, asset_id, x, y, rotation, props, layer
-                FROM node_objects
-                WHERE node_id = :id
-                ORDER BY y, x, layer, id
-                """
-            ),
-            {"id": node_id},
-        )
-    ).mappings().all()
+async def fetch_nodes(session: AsyncSession, node_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Пакетная версия fetch_node: {node_id: payload} для найденных узлов.
+    Всё, чего нет в кэше, читается одним запросом.
+    """
+    # В уже начатой транзакции могут быть свои незакоммиченные записи —
+    # там читаем базу напрямую и кэш не трогаем.
+    use_cache = not session.in_transaction()
+    out: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    now = time.monotonic()
+    for nid in dict.fromkeys(node_ids):
+        hit = _node_cache.get(nid) if use_cache else None
+        if hit and hit[0] > now:
+            out[nid] = hit[1]
+        else:
+            missing.append(nid)
+
+    if missing:
+        gen = _node_cache_gen
+        rows = await _pg_fetch(session, _PG_NODES, missing)
+        # пока шёл запрос, кэш сбросили — снимок мог устареть, не кладём его
+        store = use_cache and gen == _node_cache_gen
+        expires_at = time.monotonic() + _NODE_CACHE_TTL
+        for r in rows:
+            payload = r["payload"]
+            out[r["id"]] = payload
+            if store:
+                _node_cache[r["id"]] = (expires_at, payload, None)
+    return out
 
-    # факты
-    facts = (
-        await session.execute(
-            text(
-                """
-                SELECT k, v FROM facts WHERE node_id = :id
-                """
-            ),
-            {"id": node_id},
-        )
-    ).mappings().all()
 
-    return {
-        "id": node["id"],
-        "title": node["title"],
-        "biome": node["biome"],
-        "size": {"w": int(node["w"]), "h": int(node["h"])},
-        "actors": [dict(a) for a in actors],
-        "objects": [dict(o) for o in objects],
-        "exits": exits,
-        "facts": {f["k"]: f["v"] for f in facts},
-        "content": node.get("content"),
-        "description": node.get("description"),
-    }
+async def fetch_node(session: AsyncSession, node_id: str):
+    return (await fetch_nodes(session, [node_id])).get(node_id)
 
 
-# ===================== INVENTORY (VIEW) =====================
-async def _brief_item(session: AsyncSession, item_id):
-    """Короткое описание предмета с параметрами kind, включая контейнерные поля."""
-    if not item_id:
+async def fetch_node_json(session: AsyncSession, node_id: str) -> Optional[bytes]:
+    """
+    То же, что fetch_node, но уже в виде JSON (utf-8 bytes) — для ручек, которые
+    отдают узел как есть. Сериализуем один раз на запись кэша, дальше отдаём байты.
+    """
+    hit = _node_cache.get(node_id)
+    if hit and hit[2] is not None and hit[0] > time.monotonic() and not session.in_transaction():
+        return hit[2]
+
+    payload = await fetch_node(session, node_id)
+    if payload is None:
         return None
-    row = (
-        await session.execute(
-            text(
-                """
-                select i.id, i.kind_id, i.charges, i.durability,
-                       k.title, k.tags, k.handedness, k.props,
-                       k.grid_w, k.grid_h, k.hands_required
-                  from items i
-                  join item_kinds k on k.id = i.kind_id
-                 where i.id = :iid
-                """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    return dict(row) if row else None
+    # тот же формат, что у JSONResponse FastAPI
+    blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    hit = _node_cache.get(node_id)
+    if hit and hit[1] is payload:
+        _node_cache[node_id] = (hit[0], payload, blob)
+    return blob
 
 
-async def _grid_view(session: AsyncSession, container_item_id):
+# ===================== INVENTORY (VIEW) =====================
+def _grid_view(cont: Dict[str, Any], grid_slots: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """
-    Возвращает описание грида переносимого контейнера (рюкзак или мешок):
+    Описание грида переносимого контейнера (рюкзак или мешок):
     { item_id, grid_w, grid_h, slots:[{x,y,item_id}] }
+    cont — краткое описание контейнера, grid_slots — ячейки грида, собранные
+    в _PG_INVENTORY_VIEW по порядку.
     """
-    cont = await _brief_item(session, container_item_id)
-    if not cont:
-        return None
-
     gw = int(cont.get("grid_w") or 0)
     gh = int(cont.get("grid_h") or 0)
     if gw <= 0 or gh <= 0:
         return None  # не контейнер
 
-    rows = (
-        await session.execute(
-            text(
-                """
-                select slot_x as x, slot_y as y, item_id
-                  from carried_container_slots
-                 where container_item_id = :cid
-                 order by y, x
-                """
-            ),
-            {"cid": container_item_id},
-        )
-    ).mappings().all()
-    filled = {(r["x"], r["y"]): r["item_id"] for r in rows}
-
-    slots: List[Dict[str, Any]] = []
-    for y in range(gh):
-        for x in range(gw):
-            iid = filled.get((x, y))
-            slots.append({"x": x, "y": y, "item_id": iid})
     return {
-        "item_id": str(container_item_id),
+        "item_id": str(cont["id"]),
         "grid_w": gw,
         "grid_h": gh,
-        "slots": slots,
+        "slots": grid_slots,
     }
 
 
-async def fetch_inventory(session: AsyncSession, actor_id: str):
-    """
-    Расширенная выдача инвентаря:
-    - руки (и если в руке мешок — отдадим его грид),
-    - скрытая ячейка hidden_slot,
-    - активный рюкзак equipped_bag (грид),
-    - legacy-массив backpack (как было раньше — в поле backpack_legacy).
+# Колонки краткого описания предмета, чтобы собирать его из широких строк
+_BRIEF_ITEM_COLS = (
+    "id", "kind_id", "charges", "durability",
+    "title", "tags", "handedness", "props",
+    "grid_w", "grid_h", "hands_required",
+)
+
+
+# Число фиксированных ячеек перед backpack в _PG_INVENTORY_VIEW (см. ord)
+_INV_FIXED_SLOTS = 4
+
+# Строки инвентарей и все их предметы (руки, скрытая ячейка, рюкзак, legacy)
+# вместе со слотами гридов одним запросом: по строке на предмет, колонки
+# inventories повторяются.
+# ord: 1..4 — left/right/hidden/equipped_bag, дальше элементы backpack по порядку.
+_PG_INVENTORY_VIEW = """
+    select inv.actor_id, inv.left_item, inv.right_item, inv.hidden_slot,
+           inv.equipped_bag, inv.backpack,
+           it.ord, it.id, it.kind_id, it.charges, it.durability,
+           it.title, it.tags, it.handedness, it.props,
+           it.grid_w, it.grid_h, it.hands_required, it.slots
+      from inventories inv
+      left join lateral (
+            select ref.ord, i.id, i.kind_id, i.charges, i.durability,
+                   k.title, k.tags, k.handedness, k.props,
+                   k.grid_w, k.grid_h, k.hands_required,
+                   -- полный грид контейнеров в руках и надетого рюкзака (y, x по порядку)
+                   case when ref.ord in (1, 2, 4) and k.grid_w > 0 and k.grid_h > 0 then (
+                        select jsonb_agg(
+                                 jsonb_build_object('x', gx.x, 'y', gy.y, 'item_id', s.item_id)
+                                 order by gy.y, gx.x
+                               )
+                          from generate_series(0, k.grid_h - 1) as gy(y)
+                         cross join generate_series(0, k.grid_w - 1) as gx(x)
+                          left join carried_container_slots s
+                                 on s.container_item_id = i.id
+                                and s.slot_x = gx.x
+                                and s.slot_y = gy.y
+                   ) end as slots
+              from unnest(
+                    array[inv.left_item, inv.right_item, inv.hidden_slot, inv.equipped_bag]
+                    || inv.backpack
+                   ) with ordinality as ref(item_id, ord)
+              join items i on i.id = ref.item_id
+              join item_kinds k on k.id = i.kind_id
+           ) it on true
+     where inv.actor_id = any($1::text[])
+     order by inv.actor_id, it.ord
     """
-    inv = (
-        await session.execute(
-            text(
-                """
-                select actor_id, left_item, right_item, hidden_slot, equipped_bag, backpack
-                  from inventories
-                 where actor_id = :id
-                """
-            ),
-            {"id": actor_id},
-        )
-    ).mappings().first()
 
-    if not inv:
-        return {
-            "left_hand": None,
-            "right_hand": None,
-            "hidden_slot": None,
-            "backpack": None,
-            "backpack_legacy": [],
-        }
+
+def _empty_inventory() -> Dict[str, Any]:
+    return {
+        "left_hand": None,
+        "right_hand": None,
+        "hidden_slot": None,
+        "backpack": None,
+        "backpack_legacy": [],
+    }
+
+
+def _inventory_payload(rows) -> Dict[str, Any]:
+    """Собирает выдачу инвентаря из строк _PG_INVENTORY_VIEW одного актёра."""
+    inv = rows[0]
+    by_id: Dict[Any, Dict[str, Any]] = {
+        r["id"]: {c: r[c] for c in _BRIEF_ITEM_COLS} for r in rows if r["id"] is not None
+    }
+    slots_by_id = {r["id"]: r["slots"] for r in rows if r["slots"] is not None}
 
     # --- руки
-    left_brief = await _brief_item(session, inv["left_item"])
-    right_brief = await _brief_item(session, inv["right_item"])
+    left_brief = by_id.get(inv["left_item"])
+    right_brief = by_id.get(inv["right_item"])
 
     # если в руке переносимый контейнер (мешок/пакет) — отрисуем грид
     left_grid = None
@@ -211,7 +262,7 @@ async def fetch_inventory(session: AsyncSession, actor_id: str):
         and (left_brief.get("grid_w") and left_brief.get("grid_h"))
         and (int(left_brief.get("hands_required") or 0) == 1)
     ):
-        left_grid = await _grid_view(session, left_brief["id"])
+        left_grid = _grid_view(left_brief, slots_by_id.get(left_brief["id"]))
 
     right_grid = None
     if (
@@ -219,32 +270,24 @@ async def fetch_inventory(session: AsyncSession, actor_id: str):
         and (right_brief.get("grid_w") and right_brief.get("grid_h"))
         and (int(right_brief.get("hands_required") or 0) == 1)
     ):
-        right_grid = await _grid_view(session, right_brief["id"])
+        right_grid = _grid_view(right_brief, slots_by_id.get(right_brief["id"]))
 
     # --- скрытая ячейка
-    hidden_brief = await _brief_item(session, inv.get("hidden_slot"))
+    hidden_brief = by_id.get(inv.get("hidden_slot"))
 
     # --- активный рюкзак
     backpack_grid = None
     if inv.get("equipped_bag"):
-        backpack_grid = await _grid_view(session, inv["equipped_bag"])
-
-    # --- legacy массив (старое поле) — не ломаем
-    backpack_ids = inv.get("backpack") or []
-    backpack_legacy: List[Dict[str, Any]] = []
-    if backpack_ids:
-        stmt = (
-            text(
-                """
-            select i.id, k.id as kind_id, k.title, i.charges
-              from items i
-              join item_kinds k on k.id = i.kind_id
-             where i.id = any(:ids)
-            """
-            ).bindparams(bindparam("ids", value=backpack_ids, type_=ARRAY(UUID(as_uuid=True))))
-        )
-        rows = (await session.execute(stmt)).mappings().all()
-        backpack_legacy = [dict(r) for r in rows]
+        bag_brief = by_id.get(inv["equipped_bag"])
+        if bag_brief:
+            backpack_grid = _grid_view(bag_brief, slots_by_id.get(inv["equipped_bag"]))
+
+    # --- legacy массив (старое поле) — не ломаем, строки уже в порядке backpack
+    backpack_legacy: List[Dict[str, Any]] = [
+        {"id": r["id"], "kind_id": r["kind_id"], "title": r["title"], "charges": r["charges"]}
+        for r in rows
+        if r["ord"] is not None and r["ord"] > _INV_FIXED_SLOTS
+    ]
 
     return {
         "left_hand": {"item": left_brief, "grid": left_grid},
@@ -255,443 +298,408 @@ async def fetch_inventory(session: AsyncSession, actor_id: str):
     }
 
 
+async def fetch_inventories(session: AsyncSession, actor_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Пакетная версия fetch_inventory: {actor_id: инвентарь} одним запросом
+    (вместе с гридами контейнеров). Для актёров без строки
+    inventories — пустая выдача той же формы.
+    """
+    ids = list(dict.fromkeys(actor_ids))
+    if not ids:
+        return {}
+    rows = await _pg_fetch(session, _PG_INVENTORY_VIEW, ids)
+
+    by_actor: Dict[str, List[Any]] = {}
+    for r in rows:
+        by_actor.setdefault(r["actor_id"], []).append(r)
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for aid in ids:
+        actor_rows = by_actor.get(aid)
+        out[aid] = _inventory_payload(actor_rows) if actor_rows else _empty_inventory()
+    return out
+
+
+async def fetch_inventory(session: AsyncSession, actor_id: str):
+    """
+    Расширенная выдача инвентаря:
+    - руки (и если в руке мешок — отдадим его грид),
+    - скрытая ячейка hidden_slot,
+    - активный рюкзак equipped_bag (грид),
+    - legacy-массив backpack (как было раньше — в поле backpack_legacy).
+    """
+    return (await fetch_inventories(session, [actor_id]))[actor_id]
+
+
 # ===================== SKILLS =====================
+# Всё, что нужно для проверок learn_skill, одной строкой:
+# skill_id / actor_id = NULL — навыка / актёра нет
+_SQL_LEARN_SKILL_CHECK = text(
+    """
+    select s.id as skill_id, s.min_level,
+           a.id as actor_id, a.level, a.skill_tokens
+      from (select 1) one
+      left join skills s on s.id = :sid
+      left join actors a on a.id = :aid
+    """
+)
+
+# Выучить навык и списать токен одним запросом
+_SQL_LEARN_SKILL = text(
+    """
+    with ins as (
+        insert into actor_skills(actor_id,skill_id) values(:aid,:sid)
+        on conflict do nothing
+    )
+    update actors set skill_tokens = skill_tokens - 1 where id=:aid
+    """
+)
+
+_SQL_ACTOR_KNOWS_SKILL = text(
+    """
+    select 1 from actor_skills where actor_id=:aid and skill_id=:sid
+    """
+)
+
+# Список навыков сразу готовым json-массивом: одно значение на весь результат,
+# кодек драйвера отдаёт list[dict] без построчных обёрток.
+_PG_LIST_SKILLS = """
+    select coalesce(
+             jsonb_agg(jsonb_build_object('id', id, 'title', title, 'props', props)),
+             '[]'::jsonb
+           ) as skills
+    from skills
+"""
+
+
 async def learn_skill(session: AsyncSession, actor_id: str, skill_id: str):
-    sk = (
-        await session.execute(
-            text(
-                """
-              select id, min_level from skills where id=:sid
-            """
-            ),
-            {"sid": skill_id},
-        )
-    ).mappings().first()
-    if not sk:
+    row = (await session.execute(_SQL_LEARN_SKILL_CHECK, {"sid": skill_id, "aid": actor_id})).mappings().first()
+    if row["skill_id"] is None:
         return {"ok": False, "reason": "skill_not_found"}
 
-    actor = (
-        await session.execute(
-            text(
-                """
-              select level, skill_tokens from actors where id=:aid
-            """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not actor:
+    if row["actor_id"] is None:
         return {"ok": False, "reason": "actor_not_found"}
 
-    if (actor["level"] or 0) < (sk["min_level"] or 1):
+    if (row["level"] or 0) < (row["min_level"] or 1):
         return {"ok": False, "reason": "level_too_low"}
 
-    if (actor["skill_tokens"] or 0) < 1:
+    if (row["skill_tokens"] or 0) < 1:
         return {"ok": False, "reason": "no_tokens"}
 
-    await session.execute(
-        text(
-            """
-          insert into actor_skills(actor_id,skill_id) values(:aid,:sid)
-          on conflict do nothing
-        """
-        ),
-        {"aid": actor_id, "sid": skill_id},
-    )
-
-    await session.execute(
-        text(
-            """
-          update actors set skill_tokens = skill_tokens - 1 where id=:aid
-        """
-        ),
-        {"aid": actor_id},
-    )
+    await session.execute(_SQL_LEARN_SKILL, {"aid": actor_id, "sid": skill_id})
 
     await session.commit()
     return {"ok": True}
 
 
 async def actor_knows_skill(session: AsyncSession, actor_id: str, skill_id: str) -> bool:
-    row = await session.execute(
-        text(
-            """
-            select 1 from actor_skills where actor_id=:aid and skill_id=:sid
-        """
-        ),
-        {"aid": actor_id, "sid": skill_id},
-    )
+    row = await session.execute(_SQL_ACTOR_KNOWS_SKILL, {"aid": actor_id, "sid": skill_id})
     return row.first() is not None
 
 
-async def list_skills(session: AsyncSession):
-    rows = (
-        await session.execute(
-            text(
-                """
-                select id, title, props
-                from skills
-            """
-            )
-        )
-    ).mappings().all()
-    return [dict(r) for r in rows]
+# Справочник навыков во время работы только читается: в app нет записей в
+# skills, он меняется вместе с данными (schema.sql/сиды) и подхватывается
+# после рестарта или по TTL. Читается на каждый разбор текста — держим его
+# в процессе. Отдаваемый список общий — не мутировать.
+_SKILLS_CACHE_TTL = 300.0
+_skills_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
 
 
-# ===================== INVENTORY (DB ACTIONS) =====================
-async def _get_inventory_row(session: AsyncSession, actor_id: str):
-    return (
-        await session.execute(
-            text(
-                """
-                select actor_id, left_item, right_item, backpack
-                from inventories where actor_id=:aid
-                """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
+async def list_skills(session: AsyncSession):
+    global _skills_cache
+    hit = _skills_cache
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
 
+    row = await _pg_fetchrow(session, _PG_LIST_SKILLS)
+    skills = row["skills"]
+    _skills_cache = (time.monotonic() + _SKILLS_CACHE_TTL, skills)
+    return skills
 
-async def _item_view_full(session: AsyncSession, item_id) -> Optional[Dict[str, Any]]:
-    if not item_id:
-        return None
-    row = (
-        await session.execute(
-            text(
-                """
-                select i.id, i.kind_id, i.charges, i.durability,
-                       k.title, k.tags, k.handedness, k.props
-                from items i
-                join item_kinds k on k.id = i.kind_id
-                where i.id = :iid
-                """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    return dict(row) if row else None
 
-
-async def _handedness(session: AsyncSession, item_id) -> str:
-    r = (
-        await session.execute(
-            text(
-                """
-                select k.handedness
-                from items i join item_kinds k on k.id=i.kind_id
-                where i.id=:iid
-                """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    return (r and r["handedness"]) or "one_hand"
+# ===================== INVENTORY (DB ACTIONS) =====================
+# equip/unequip и действия с рюкзаком/мешком ниже не коммитят сами —
+# commit делает вызывающий (роутер), один на запрос.
+
+# Взять предмет из рюкзака в руку одним запросом: проверки (есть ли в рюкзаке,
+# свободна ли рука / обе руки для двуручного) считаются в SQL, UPDATE выполняется
+# только при error IS NULL. Нет строки — нет инвентаря.
+_SQL_EQUIP_ITEM = text(
+    """
+    WITH pre AS (
+        SELECT inv.actor_id, inv.left_item, inv.right_item,
+               inv.backpack @> ARRAY[CAST(:iid AS uuid)] AS in_bp,
+               coalesce(k.handedness, 'one_hand') IN ('one_hand', 'one_hands') AS one_hand,
+               k.title
+          FROM inventories inv
+          LEFT JOIN items i ON i.id = CAST(:iid AS uuid)
+          LEFT JOIN item_kinds k ON k.id = i.kind_id
+         WHERE inv.actor_id = :aid
+           FOR UPDATE OF inv
+    ),
+    chk AS (
+        SELECT pre.*,
+               CASE
+                    WHEN NOT pre.in_bp THEN 'not_in_backpack'
+                    WHEN pre.one_hand
+                         AND (CASE WHEN :hand = 'left' THEN pre.left_item ELSE pre.right_item END) IS NOT NULL
+                         THEN 'hand_occupied'
+                    WHEN NOT pre.one_hand
+                         AND (pre.left_item IS NOT NULL OR pre.right_item IS NOT NULL)
+                         THEN 'need_both_hands_free'
+               END AS error
+          FROM pre
+    ),
+    upd AS (
+        UPDATE inventories t
+           SET backpack = array_remove(t.backpack, CAST(:iid AS uuid)),
+               left_item = CASE WHEN NOT chk.one_hand OR :hand = 'left' THEN CAST(:iid AS uuid) ELSE t.left_item END,
+               right_item = CASE WHEN NOT chk.one_hand OR :hand <> 'left' THEN CAST(:iid AS uuid) ELSE t.right_item END
+          FROM chk
+         WHERE t.actor_id = chk.actor_id
+           AND chk.error IS NULL
+    )
+    SELECT error, one_hand, title FROM chk
+    """
+)
+
+# Убрать предмет из руки в рюкзак одним запросом (двуручный освобождает обе руки).
+# cur IS NULL — рука пуста, ничего не меняется.
+_SQL_UNEQUIP_ITEM = text(
+    """
+    WITH pre AS (
+        SELECT inv.actor_id,
+               CASE WHEN :hand = 'left' THEN inv.left_item ELSE inv.right_item END AS cur
+          FROM inventories inv
+         WHERE inv.actor_id = :aid
+           FOR UPDATE
+    ),
+    info AS (
+        SELECT pre.*,
+               coalesce(k.handedness, 'one_hand') = 'two_hands' AS two_hands,
+               k.title
+          FROM pre
+          LEFT JOIN items i ON i.id = pre.cur
+          LEFT JOIN item_kinds k ON k.id = i.kind_id
+    ),
+    upd AS (
+        UPDATE inventories t
+           SET left_item = CASE WHEN info.two_hands OR :hand = 'left' THEN NULL ELSE t.left_item END,
+               right_item = CASE WHEN info.two_hands OR :hand <> 'left' THEN NULL ELSE t.right_item END,
+               backpack = array_append(t.backpack, info.cur)
+          FROM info
+         WHERE t.actor_id = info.actor_id
+           AND info.cur IS NOT NULL
+    )
+    SELECT cur, two_hands, title FROM info
+    """
+)
 
 
 async def equip_item_db(session: AsyncSession, actor_id: str, hand: str, item_id) -> List[Dict[str, Any]]:
-    inv = await _get_inventory_row(session, actor_id)
-    if not inv:
+    row = (
+        await session.execute(_SQL_EQUIP_ITEM, {"iid": item_id, "aid": actor_id, "hand": hand})
+    ).mappings().first()
+    if not row:
         raise ValueError("Inventory not found")
 
-    in_backpack = await session.execute(
-        text(
-            """
-            select CAST(:iid AS uuid) = any(coalesce(backpack,'{}'::uuid[])) as ok
-            from inventories where actor_id=:aid
-        """
-        ),
-        {"iid": item_id, "aid": actor_id},
-    )
-    if not in_backpack.scalar():
+    if row["error"] == "not_in_backpack":
         return [{"type": "TEXT", "payload": {"text": "Этого предмета нет в рюкзаке."}}]
+    if row["error"] == "hand_occupied":
+        return [{"type": "TEXT", "payload": {"text": f"Рука {hand} занята."}}]
+    if row["error"] == "need_both_hands_free":
+        return [{"type": "TEXT", "payload": {"text": "Это двуручный предмет — освободите обе руки."}}]
 
-    hd = await _handedness(session, item_id)
-
-    if hd in ("one_hands", "one_hand"):
-        current = inv[f"{hand}_item"]
-        if current:
-            return [{"type": "TEXT", "payload": {"text": f"Рука {hand} занята."}}]
-
-        await session.execute(
-            text(
-                f"""
-                update inventories
-                set backpack = array_remove(coalesce(backpack,'{{}}'::uuid[]), CAST(:iid AS uuid)),
-                    { 'left_item' if hand=='left' else 'right_item' } = CAST(:iid AS uuid)
-                where actor_id=:aid
-                """
-            ),
-            {"iid": item_id, "aid": actor_id},
-        )
-        await session.commit()
-
-        iv = await _item_view_full(session, item_id)
+    if row["one_hand"]:
         return [
-            {"type": "EQUIP_CHANGE", "payload": {"hand": hand, "item": iv["title"]}},
-            {"type": "TEXT", "payload": {"text": f"Вы взяли в {hand} {iv['title']}."}},
+            {"type": "EQUIP_CHANGE", "payload": {"hand": hand, "item": row["title"]}},
+            {"type": "TEXT", "payload": {"text": f"Вы взяли в {hand} {row['title']}."}},
         ]
-
-    if inv["left_item"] or inv["right_item"]:
-        return [{"type": "TEXT", "payload": {"text": "Это двуручный предмет — освободите обе руки."}}]
-
-    await session.execute(
-        text(
-            """
-            update inventories
-            set backpack = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid)),
-                left_item = CAST(:iid AS uuid),
-                right_item = CAST(:iid AS uuid)
-            where actor_id=:aid
-            """
-        ),
-        {"iid": item_id, "aid": actor_id},
-    )
-    await session.commit()
-
-    iv = await _item_view_full(session, item_id)
     return [
-        {"type": "EQUIP_CHANGE", "payload": {"hand": "both", "item": iv["title"]}},
-        {"type": "TEXT", "payload": {"text": f"Вы взяли {iv['title']} двумя руками."}},
+        {"type": "EQUIP_CHANGE", "payload": {"hand": "both", "item": row["title"]}},
+        {"type": "TEXT", "payload": {"text": f"Вы взяли {row['title']} двумя руками."}},
     ]
 
 
 async def unequip_item_db(session: AsyncSession, actor_id: str, hand: str) -> List[Dict[str, Any]]:
-    inv = await _get_inventory_row(session, actor_id)
-    if not inv:
+    row = (await session.execute(_SQL_UNEQUIP_ITEM, {"aid": actor_id, "hand": hand})).mappings().first()
+    if not row:
         raise ValueError("Inventory not found")
 
-    cur = inv[f"{hand}_item"]
-    if not cur:
+    if not row["cur"]:
         return [{"type": "TEXT", "payload": {"text": f"В {hand} руке пусто."}}]
 
-    hd = await _handedness(session, cur)
-    if hd == "two_hands":
-        await session.execute(
-            text(
-                """
-                update inventories
-                set left_item = null, right_item = null,
-                    backpack = array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-                where actor_id=:aid
-                """
-            ),
-            {"iid": cur, "aid": actor_id},
-        )
-        await session.commit()
-
-        iv = await _item_view_full(session, cur)
-        return [
-            {"type": "EQUIP_CHANGE", "payload": {"hand": "both", "item": None}},
-            {"type": "TEXT", "payload": {"text": f"Вы убрали {iv['title']} в рюкзак."}},
-        ]
-
-    await session.execute(
-        text(
-            f"""
-            update inventories
-            set { 'left_item' if hand=='left' else 'right_item' } = null,
-                backpack = array_append(coalesce(backpack,'{{}}'::uuid[]), CAST(:iid AS uuid))
-            where actor_id=:aid
-            """
-        ),
-        {"iid": cur, "aid": actor_id},
-    )
-    await session.commit()
-
-    iv = await _item_view_full(session, cur)
     return [
-        {"type": "EQUIP_CHANGE", "payload": {"hand": hand, "item": None}},
-        {"type": "TEXT", "payload": {"text": f"Вы убрали {iv['title']} в рюкзак."}},
+        {"type": "EQUIP_CHANGE", "payload": {"hand": "both" if row["two_hands"] else hand, "item": None}},
+        {"type": "TEXT", "payload": {"text": f"Вы убрали {row['title']} в рюкзак."}},
     ]
 
 
-# ===================== USE / COMBINE (DB) =====================
-async def use_item_db(session: AsyncSession, actor_id: str, item_id, target: Optional[str]) -> List[Dict[str, Any]]:
-    iv = await _item_view_full(session, item_id)
-    if not iv:
-        return [{"type": "TEXT", "payload": {"text": "Предмет не найден."}}]
+# ===================== COMBINE (DB) =====================
+# Обе руки с предметами одним чтением: l_* / r_* — NULL, если рука пуста
+_SQL_COMBINE_HANDS = text(
+    """
+    select inv.left_item, inv.right_item,
+           lk.id as l_kind_id, li.charges as l_charges, lk.title as l_title,
+           rk.id as r_kind_id, ri.charges as r_charges, rk.title as r_title
+      from inventories inv
+      left join items li on li.id = inv.left_item
+      left join item_kinds lk on lk.id = li.kind_id
+      left join items ri on ri.id = inv.right_item
+      left join item_kinds rk on rk.id = ri.kind_id
+     where inv.actor_id = :aid
+    """
+)
 
-    props = iv.get("props") or {}
-    ev: List[Dict[str, Any]] = []
+# Списать по заряду с обоих предметов одним UPDATE
+_SQL_CONSUME_PAIR = text(
+    """
+    update items set charges = charges - 1
+    where id = any(array[CAST(:l AS uuid), CAST(:r AS uuid)])
+    returning id, charges
+    """
+)
 
-    async def _consume(amount: int):
-        if iv["charges"] is None:
-            return
-        if (iv["charges"] or 0) < amount:
-            ev.append({"type": "TEXT", "payload": {"text": f"{iv['title']} пуст."}})
-            return
-        row = (
-            await session.execute(
-                text(
-                    """
-                    update items set charges = charges - :amt
-                    where id=:iid
-                    returning charges
-                    """
-                ),
-                {"amt": amount, "iid": item_id},
-            )
-        ).mappings().first()
-        left = row and row["charges"]
-        ev.append({"type": "CONSUME", "payload": {"item": iv["title"], "delta": -amount, "left": left}})
-
-    if props.get("water"):
-        await _consume(props.get("consumes_per_use", 1))
-        ev.append({"type": "FX", "payload": {"kind": "splash", "on": target or "ground"}})
-        ev.append({"type": "TEXT", "payload": {"text": "Вы плеснули воду."}})
-    elif props.get("ignite"):
-        await _consume(props.get("consumes_per_use", 1))
-        ev.append({"type": "FX", "payload": {"kind": "spark", "on": target or "front"}})
-        ev.append({"type": "TEXT", "payload": {"text": "Щёлк! Искра вспыхнула."}})
-    else:
-        ev.append({"type": "TEXT", "payload": {"text": "Ничего не произошло."}})
 
+async def _combine_flamethrower(session: AsyncSession, hands) -> List[Dict[str, Any]]:
+    """Зажигалка + дезодорант: по заряду с обоих, конус огня."""
+    if (hands["l_charges"] or 0) < 1 or (hands["r_charges"] or 0) < 1:
+        return [{"type": "TEXT", "payload": {"text": "Не хватает зарядов."}}]
+
+    left = hands["left_item"]
+    right = hands["right_item"]
+    rows = (await session.execute(_SQL_CONSUME_PAIR, {"l": left, "r": right})).mappings().all()
+    charges_left = {r["id"]: r["charges"] for r in rows}
+
+    ev: List[Dict[str, Any]] = []
+    for iid, title in ((left, hands["l_title"]), (right, hands["r_title"])):
+        ev.append({"type": "CONSUME", "payload": {"item": title, "delta": -1, "left": charges_left.get(iid)}})
+    ev.append({"type": "FX", "payload": {"kind": "flame_cone", "dir": "front", "range": 3, "width": 2}})
+    ev.append({"type": "STATUS_APPLY", "payload": {"status": "Burn", "targets": "in_cone", "duration": 2}})
+    ev.append({"type": "TEXT", "payload": {"text": "Вы пускаете струю огня!"}})
     await session.commit()
     return ev
 
 
-async def combine_use_db(session: AsyncSession, actor_id: str) -> List[Dict[str, Any]]:
-    inv = await _get_inventory_row(session, actor_id)
-    left = inv["left_item"]
-    right = inv["right_item"]
-    if not left or not right:
-        return [{"type": "TEXT", "payload": {"text": "Нужно держать предметы в обеих руках."}}]
+# Рецепты комбинирования: пара kind_id (без учёта рук) -> обработчик(session, hands)
+_RECIPES: Dict[frozenset, Callable[[AsyncSession, Any], Awaitable[List[Dict[str, Any]]]]] = {
+    frozenset({"lighter", "deodorant"}): _combine_flamethrower,
+}
 
-    lv = await _item_view_full(session, left)
-    rv = await _item_view_full(session, right)
-    pair = {lv["kind_id"], rv["kind_id"]}
 
-    ev: List[Dict[str, Any]] = []
+async def combine_use_db(session: AsyncSession, actor_id: str) -> List[Dict[str, Any]]:
+    hands = (await session.execute(_SQL_COMBINE_HANDS, {"aid": actor_id})).mappings().first()
+    if not hands:
+        raise ValueError("Inventory not found")
+    if not hands["left_item"] or not hands["right_item"]:
+        return [{"type": "TEXT", "payload": {"text": "Нужно держать предметы в обеих руках."}}]
 
-    async def _consume(iid, title, amount: int = 1):
-        row = (
-            await session.execute(
-                text(
-                    """
-                    update items set charges = charges - :amt
-                    where id=:iid
-                    returning charges
-                    """
-                ),
-                {"amt": amount, "iid": iid},
-            )
-        ).mappings().first()
-        left = row and row["charges"]
-        ev.append({"type": "CONSUME", "payload": {"item": title, "delta": -amount, "left": left}})
-
-    if pair == {"lighter", "deodorant"}:
-        if (lv["charges"] or 0) < 1 or (rv["charges"] or 0) < 1:
-            return [{"type": "TEXT", "payload": {"text": "Не хватает зарядов."}}]
-        await _consume(left, lv["title"], 1)
-        await _consume(right, rv["title"], 1)
-        ev.append({"type": "FX", "payload": {"kind": "flame_cone", "dir": "front", "range": 3, "width": 2}})
-        ev.append({"type": "STATUS_APPLY", "payload": {"status": "Burn", "targets": "in_cone", "duration": 2}})
-        ev.append({"type": "TEXT", "payload": {"text": "Вы пускаете струю огня!"}})
-        await session.commit()
-        return ev
+    handler = _RECIPES.get(frozenset((hands["l_kind_id"], hands["r_kind_id"])))
+    if handler:
+        return await handler(session, hands)
 
     return [{"type": "TEXT", "payload": {"text": "Эти предметы не комбинируются."}}]
 
 
 # ===================== BACKPACK / BAG EQUIP (FIXED) =====================
+# Предмет-контейнер вместе с инвентарём актёра одним чтением:
+# has_inventory = false — строки инвентаря нет (колонки inv.* тогда NULL)
+_SQL_BAG_WITH_INVENTORY = text(
+    """
+    SELECT i.id, i.kind_id, k.grid_w, k.grid_h, k.hands_required, k.title,
+           inv.actor_id IS NOT NULL AS has_inventory,
+           inv.backpack, inv.equipped_bag, inv.left_item, inv.right_item
+      FROM items i
+      JOIN item_kinds k ON k.id = i.kind_id
+      LEFT JOIN inventories inv ON inv.actor_id = :aid
+     WHERE i.id = :iid
+    """
+)
+
+_SQL_EQUIP_BACKPACK = text(
+    """
+    UPDATE inventories
+       SET equipped_bag = CAST(:iid AS uuid),
+           backpack     = array_remove(backpack, CAST(:iid AS uuid)),
+           left_item    = CASE WHEN left_item  = CAST(:iid AS uuid) THEN NULL ELSE left_item END,
+           right_item   = CASE WHEN right_item = CAST(:iid AS uuid) THEN NULL ELSE right_item END
+     WHERE actor_id = :aid
+    """
+)
+
+# Снять рюкзак и вернуть его id одним запросом; строки нет — рюкзака нет
+_SQL_UNEQUIP_BACKPACK = text(
+    """
+    WITH cur AS (
+        SELECT actor_id, equipped_bag
+          FROM inventories
+         WHERE actor_id = :aid
+           FOR UPDATE
+    )
+    UPDATE inventories t
+       SET equipped_bag = NULL,
+           backpack     = array_append(t.backpack, cur.equipped_bag)
+      FROM cur
+     WHERE t.actor_id = cur.actor_id
+       AND cur.equipped_bag IS NOT NULL
+    RETURNING cur.equipped_bag
+    """
+)
+
+# Мешок из backpack в руку; рука — параметром, чтобы текст запроса был один
+_SQL_HOLD_BAG = text(
+    """
+    UPDATE inventories
+       SET left_item   = CASE WHEN :hand = 'left'  THEN CAST(:iid AS uuid) ELSE left_item END,
+           right_item  = CASE WHEN :hand = 'right' THEN CAST(:iid AS uuid) ELSE right_item END,
+           backpack    = array_remove(backpack, CAST(:iid AS uuid))
+     WHERE actor_id=:aid
+    """
+)
+
+
 async def equip_backpack_db(session: AsyncSession, actor_id: str, item_id: str):
     """
     Надеть рюкзак: если предмет - контейнер (grid_w>0) и нет уже надетого,
     устанавливаем equipped_bag = item_id, убираем его из рюкзака-списка
     и (важно) освобождаем руку, если этот предмет был в одной из рук.
     """
-    row = (
-        await session.execute(
-            text(
-                """
-                SELECT i.id, i.kind_id, k.grid_w, k.grid_h, k.hands_required, k.title
-                  FROM items i
-                  JOIN item_kinds k ON k.id = i.kind_id
-                 WHERE i.id = :iid
-                """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
+    row = (await session.execute(_SQL_BAG_WITH_INVENTORY, {"iid": item_id, "aid": actor_id})).mappings().first()
     if not row:
         return {"ok": False, "error": "item_not_found"}
 
     if not row["grid_w"]:
         return {"ok": False, "error": "not_a_container"}
 
-    inv = (
-        await session.execute(
-            text(
-                """
-                SELECT backpack, equipped_bag, left_item, right_item
-                  FROM inventories WHERE actor_id=:aid
-                """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not inv:
+    if not row["has_inventory"]:
         return {"ok": False, "error": "no_inventory"}
 
-    if inv["equipped_bag"]:
+    if row["equipped_bag"]:
         return {"ok": False, "error": "already_has_backpack"}
 
-    # Нормализуем к строкам для корректного сравнения UUID <-> str
-    bp_ids = [str(x) for x in (inv["backpack"] or [])]
-    in_backpack = str(item_id) in bp_ids
-    in_left = (inv["left_item"] is not None) and (str(inv["left_item"]) == str(item_id))
-    in_right = (inv["right_item"] is not None) and (str(inv["right_item"]) == str(item_id))
+    # Сравниваем uuid.UUID как есть: row["id"] — тот же предмет, что пришёл из БД
+    bag_id = row["id"]
+    in_backpack = bag_id in row["backpack"]
+    in_left = row["left_item"] == bag_id
+    in_right = row["right_item"] == bag_id
 
     if not (in_backpack or in_left or in_right):
         return {"ok": False, "error": "item_not_owned"}
 
     # Надеваем: снимаем из массива/backpack, и если был в руке — освобождаем её
-    await session.execute(
-        text(
-            """
-            UPDATE inventories
-               SET equipped_bag = CAST(:iid AS uuid),
-                   backpack     = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid)),
-                   left_item    = CASE WHEN left_item  = CAST(:iid AS uuid) THEN NULL ELSE left_item END,
-                   right_item   = CASE WHEN right_item = CAST(:iid AS uuid) THEN NULL ELSE right_item END
-             WHERE actor_id = :aid
-            """
-        ),
-        {"iid": item_id, "aid": actor_id},
-    )
-    await session.commit()
+    await session.execute(_SQL_EQUIP_BACKPACK, {"iid": item_id, "aid": actor_id})
     return {"ok": True, "title": row["title"]}
 
 
 async def unequip_backpack_db(session: AsyncSession, actor_id: str):
     """
     Снять рюкзак: перенести его из equipped_bag обратно в массив backpack (uuid[]).
-    Используем array_append(..., CAST(:iid AS uuid)), а не '|| :iid'.
+    Используем array_append(...), а не '|| :iid'.
     """
-    inv = (
-        await session.execute(
-            text("""SELECT equipped_bag FROM inventories WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not inv or not inv["equipped_bag"]:
+    item_id = await session.scalar(_SQL_UNEQUIP_BACKPACK, {"aid": actor_id})
+    if not item_id:
         return {"ok": False, "error": "no_backpack"}
 
-    item_id = inv["equipped_bag"]
-
-    await session.execute(
-        text(
-            """
-            UPDATE inventories
-               SET equipped_bag = NULL,
-                   backpack     = array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id = :aid
-            """
-        ),
-        {"iid": item_id, "aid": actor_id},
-    )
-    await session.commit()
     return {"ok": True, "item_id": str(item_id)}
 
 
@@ -699,55 +707,94 @@ async def hold_bag_db(session: AsyncSession, actor_id: str, item_id: str, hand:
     """
     Взять мешок в руку (если она свободна). Проверяем, что это контейнер с hands_required=1.
     """
-    row = (
-        await session.execute(
-            text(
-                """
-                SELECT i.id, i.kind_id, k.grid_w, k.grid_h, k.hands_required, k.title
-                  FROM items i
-                  JOIN item_kinds k ON k.id = i.kind_id
-                 WHERE i.id = :iid
-                """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
+    row = (await session.execute(_SQL_BAG_WITH_INVENTORY, {"iid": item_id, "aid": actor_id})).mappings().first()
     if not row:
         return {"ok": False, "error": "item_not_found"}
 
     if (not row["grid_w"]) or row["hands_required"] != 1:
         return {"ok": False, "error": "not_a_handheld_bag"}
 
-    inv = (
-        await session.execute(
-            text("""SELECT left_item, right_item, backpack FROM inventories WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not inv:
+    if not row["has_inventory"]:
         return {"ok": False, "error": "no_inventory"}
 
-    current = inv[f"{hand}_item"]
+    current = row[f"{hand}_item"]
     if current:
         return {"ok": False, "error": "hand_occupied"}
 
     # Перемещаем из массива backpack в руку
-    await session.execute(
-        text(
-            f"""
-            UPDATE inventories
-               SET {hand}_item = CAST(:iid AS uuid),
-                   backpack    = array_remove(coalesce(backpack,'{{}}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id=:aid
-            """
-        ),
-        {"iid": item_id, "aid": actor_id},
-    )
-    await session.commit()
+    await session.execute(_SQL_HOLD_BAG, {"iid": item_id, "aid": actor_id, "hand": hand})
     return {"ok": True, "title": row["title"], "hand": hand}
 
 
 # ===================== UNIVERSAL TRANSFER (no grid) =====================
+# Перенос одним атомарным запросом: блокируем строку инвентаря, определяем
+# предмет, проверяем источник/цель (код ошибки — в колонке error, порядок
+# проверок как раньше) и, если ошибок нет, переписываем обе ячейки сразу.
+# Строки нет — инвентаря нет.
+_SQL_TRANSFER = text(
+    """
+    WITH inv AS (
+        SELECT actor_id, left_item, right_item, hidden_slot, backpack
+          FROM inventories
+         WHERE actor_id = :aid
+           FOR UPDATE
+    ),
+    src AS (
+        SELECT inv.*,
+               CASE :source
+                    WHEN 'left'  THEN coalesce(CAST(:iid AS uuid), inv.left_item)
+                    WHEN 'right' THEN coalesce(CAST(:iid AS uuid), inv.right_item)
+                    ELSE CAST(:iid AS uuid)
+               END AS item_id
+          FROM inv
+    ),
+    chk AS (
+        SELECT src.*,
+               coalesce(k.handedness, 'one_hand') AS handedness,
+               CASE
+                    WHEN :source IN ('left', 'right') AND src.item_id IS NULL THEN 'source_empty'
+                    WHEN :source = 'backpack' AND src.item_id IS NULL THEN 'item_id_required'
+                    WHEN :source = 'backpack' AND NOT (src.item_id = ANY(src.backpack)) THEN 'not_in_backpack'
+                    WHEN :source NOT IN ('left', 'right', 'backpack') THEN 'bad_source'
+                    WHEN :target = 'left' AND src.left_item IS NOT NULL THEN 'hand_occupied'
+                    WHEN :target = 'right' AND src.right_item IS NOT NULL THEN 'hand_occupied'
+                    WHEN :target IN ('left', 'right') AND k.handedness = 'two_hands'
+                         AND (src.left_item IS NOT NULL OR src.right_item IS NOT NULL) THEN 'need_both_hands_free'
+                    WHEN :target = 'hidden' AND src.hidden_slot IS NOT NULL THEN 'hidden_busy'
+                    WHEN :target NOT IN ('left', 'right', 'hidden', 'backpack') THEN 'bad_target'
+               END AS error
+          FROM src
+          LEFT JOIN items i ON i.id = src.item_id
+          LEFT JOIN item_kinds k ON k.id = i.kind_id
+    ),
+    upd AS (
+        UPDATE inventories t
+           SET left_item = CASE
+                    -- двуручный занимает обе руки
+                    WHEN :target = 'left' OR (:target = 'right' AND chk.handedness = 'two_hands') THEN chk.item_id
+                    WHEN :source = 'left' THEN NULL
+                    ELSE t.left_item
+               END,
+               right_item = CASE
+                    WHEN :target = 'right' OR (:target = 'left' AND chk.handedness = 'two_hands') THEN chk.item_id
+                    WHEN :source = 'right' THEN NULL
+                    ELSE t.right_item
+               END,
+               hidden_slot = CASE WHEN :target = 'hidden' THEN chk.item_id ELSE t.hidden_slot END,
+               backpack = CASE
+                    WHEN :source = 'backpack' THEN array_remove(chk.backpack, chk.item_id)
+                    WHEN :target = 'backpack' THEN array_append(chk.backpack, chk.item_id)
+                    ELSE t.backpack
+               END
+          FROM chk
+         WHERE t.actor_id = chk.actor_id
+           AND chk.error IS NULL
+    )
+    SELECT error, item_id FROM chk
+    """
+)
+
+
 async def transfer_item_db(
     session: AsyncSession,
     actor_id: str,
@@ -758,7 +805,7 @@ async def transfer_item_db(
     """
     Перемещает один предмет между: left/right/hidden/backpack (без работы с grid).
     Если item_id не указан:
-      - при source in {left,right,hidden} берём текущий предмет оттуда,
+      - при source in {left,right} берём текущий предмет оттуда,
       - при source=backpack вернём ошибку (нужен item_id).
     """
     if source == target:
@@ -768,218 +815,89 @@ async def transfer_item_db(
     if source == "hidden":
         return {"ok": False, "error": "hidden_protected"}
 
-    # заберем текущие значения
-    inv = (
+    row = (
         await session.execute(
-            text(
-                """SELECT left_item, right_item, hidden_slot, backpack
-                   FROM inventories WHERE actor_id=:aid"""
-            ),
-            {"aid": actor_id},
+            _SQL_TRANSFER,
+            {"aid": actor_id, "source": source, "target": target, "iid": item_id},
         )
     ).mappings().first()
-    if not inv:
+    if not row:
         return {"ok": False, "error": "no_inventory"}
-
-    def _get_from_place(place: str) -> Optional[str]:
-        if place == "left":
-            return inv["left_item"]
-        if place == "right":
-            return inv["right_item"]
-        if place == "hidden":
-            return inv["hidden_slot"]
-        return None
-
-    # 1) Определяем item_id
-    if source in ("left", "right", "hidden"):
-        item_id = item_id or _get_from_place(source)
-        if not item_id:
-            return {"ok": False, "error": "source_empty"}
-    elif source == "backpack":
-        if not item_id:
-            return {"ok": False, "error": "item_id_required"}
-        # убедимся, что он в backpack
-        in_bp = (
-            await session.execute(
-                text(
-                    """
-                    SELECT CAST(:iid AS uuid) = ANY(coalesce(backpack,'{}'::uuid[])) AS ok
-                      FROM inventories WHERE actor_id=:aid
-                    """
-                ),
-                {"iid": item_id, "aid": actor_id},
-            )
-        ).scalar()
-        if not in_bp:
-            return {"ok": False, "error": "not_in_backpack"}
-    else:
-        return {"ok": False, "error": "bad_source"}
-
-    # 2) Проверка целевого места
-    if target in ("left", "right"):
-        # рука должна быть свободна
-        cur = inv[f"{target}_item"]
-        if cur:
-            return {"ok": False, "error": "hand_occupied"}
-        # если предмет двуручный — обе руки должны быть свободны
-        hd = await _handedness(session, item_id)
-        if hd == "two_hands":
-            if inv["left_item"] or inv["right_item"]:
-                return {"ok": False, "error": "need_both_hands_free"}
-
-    if target == "hidden":
-        if inv["hidden_slot"]:
-            return {"ok": False, "error": "hidden_busy"}
-
-    if target not in ("left", "right", "hidden", "backpack"):
-        return {"ok": False, "error": "bad_target"}
-
-    # 3) Удаляем из source
-    if source == "left":
-        await session.execute(
-            text("""UPDATE inventories SET left_item = NULL WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
-    elif source == "right":
-        await session.execute(
-            text("""UPDATE inventories SET right_item = NULL WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
-    elif source == "hidden":
-        # сюда не дойдём из-за защиты; оставлено для полноты.
-        await session.execute(
-            text("""UPDATE inventories SET hidden_slot = NULL WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
-    elif source == "backpack":
-        await session.execute(
-            text(
-                """UPDATE inventories
-                       SET backpack = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-                     WHERE actor_id=:aid"""
-            ),
-            {"aid": actor_id, "iid": item_id},
-        )
-
-    # 4) Кладём в target
-    if target == "left":
-        # если двуручный — занимаем обе руки
-        if await _handedness(session, item_id) == "two_hands":
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories
-                   SET left_item = CAST(:iid AS uuid),
-                       right_item = CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-                """
-                ),
-                {"aid": actor_id, "iid": item_id},
-            )
-        else:
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET left_item = CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-                """
-                ),
-                {"aid": actor_id, "iid": item_id},
-            )
-
-    elif target == "right":
-        if await _handedness(session, item_id) == "two_hands":
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories
-                   SET left_item = CAST(:iid AS uuid),
-                       right_item = CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-                """
-                ),
-                {"aid": actor_id, "iid": item_id},
-            )
-        else:
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET right_item = CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-                """
-                ),
-                {"aid": actor_id, "iid": item_id},
-            )
-
-    elif target == "hidden":
-        await session.execute(
-            text(
-                """
-            UPDATE inventories SET hidden_slot = CAST(:iid AS uuid)
-             WHERE actor_id=:aid
-            """
-            ),
-            {"aid": actor_id, "iid": item_id},
-        )
-
-    elif target == "backpack":
-        await session.execute(
-            text(
-                """
-            UPDATE inventories
-               SET backpack = array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id=:aid
-            """
-            ),
-            {"aid": actor_id, "iid": item_id},
-        )
+    if row["error"]:
+        return {"ok": False, "error": row["error"]}
 
     await session.commit()
-    return {"ok": True, "moved": str(item_id), "from": source, "to": target}
+    return {"ok": True, "moved": str(row["item_id"]), "from": source, "to": target}
 
 
 # ===================== GRID PUT/TAKE (equipped bag or hand-held sack) =====================
-async def _owns_container(session: AsyncSession, actor_id: str, container_item_id: str) -> Tuple[bool, str]:
-    """Проверяем, что контейнер принадлежит актёру: либо надет (equipped_bag), либо в руке left/right."""
-    row = (
-        await session.execute(
-            text(
-                """
-        SELECT equipped_bag, left_item, right_item
-          FROM inventories WHERE actor_id=:aid
-    """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not row:
-        return False, "no_inventory"
-    cid = str(container_item_id)
-    if row["equipped_bag"] and str(row["equipped_bag"]) == cid:
-        return True, "equipped"
-    if row["left_item"] and str(row["left_item"]) == cid:
-        return True, "left"
-    if row["right_item"] and str(row["right_item"]) == cid:
-        return True, "right"
-    return False, "not_owner"
-
-
-async def _is_container(session: AsyncSession, item_id: str) -> bool:
-    r = (
-        await session.execute(
-            text(
-                """
-        SELECT COALESCE(k.grid_w,0) AS gw, COALESCE(k.grid_h,0) AS gh
-          FROM items i JOIN item_kinds k ON k.id = i.kind_id
-         WHERE i.id = :iid
+
+# Проверки grid_put_item_db одним чтением; решения — в Python в прежнем порядке.
+# Занятость слота не читаем: её решает ON CONFLICT в _SQL_GRID_PUT_MOVE.
+# item_is_container NULL — предмета нет; owned_as — как актёр держит контейнер
+# (equipped/left/right) или NULL; in_source NULL — неизвестный source_place.
+# Строка инвентаря блокируется до commit: параллельный put/take/drop того же
+# актёра ждёт, а не проходит проверки по устаревшему состоянию.
+_SQL_GRID_PUT_CHECK = text(
+    """
+    SELECT (SELECT coalesce(k.grid_w, 0) > 0 AND coalesce(k.grid_h, 0) > 0
+              FROM items i JOIN item_kinds k ON k.id = i.kind_id
+             WHERE i.id = CAST(:iid AS uuid)) AS item_is_container,
+           inv.actor_id IS NOT NULL AS has_inventory,
+           CASE
+                WHEN inv.equipped_bag = CAST(:cid AS uuid) THEN 'equipped'
+                WHEN inv.left_item    = CAST(:cid AS uuid) THEN 'left'
+                WHEN inv.right_item   = CAST(:cid AS uuid) THEN 'right'
+           END AS owned_as,
+           coalesce(ck.grid_w, 0) AS grid_w, coalesce(ck.grid_h, 0) AS grid_h,
+           CASE :source
+                WHEN 'backpack' THEN inv.backpack @> ARRAY[CAST(:iid AS uuid)]
+                WHEN 'left'     THEN inv.left_item   = CAST(:iid AS uuid)
+                WHEN 'right'    THEN inv.right_item  = CAST(:iid AS uuid)
+                WHEN 'hidden'   THEN inv.hidden_slot = CAST(:iid AS uuid)
+           END AS in_source
+      FROM (SELECT 1) one
+      LEFT JOIN LATERAL (
+            SELECT * FROM inventories WHERE actor_id = :aid FOR UPDATE
+           ) inv ON true
+      LEFT JOIN items ci ON ci.id = CAST(:cid AS uuid)
+      LEFT JOIN item_kinds ck ON ck.id = ci.kind_id
+    """
+)
+
+
+# Положить в слот: INSERT … ON CONFLICT DO NOTHING (занятый слот — 0 строк) и,
+# только если вставка прошла, освобождаем source_place. Предмет должен всё ещё
+# лежать в source — иначе тоже ничего не пишем. Возвращает число вставленных.
+_SQL_GRID_PUT_MOVE = text(
+    """
+    WITH ins AS (
+        INSERT INTO carried_container_slots(container_item_id, slot_x, slot_y, item_id)
+        SELECT CAST(:cid AS uuid), :x, :y, CAST(:iid AS uuid)
+          FROM inventories inv
+         WHERE inv.actor_id = :aid
+           AND CASE :source
+                    WHEN 'backpack' THEN inv.backpack @> ARRAY[CAST(:iid AS uuid)]
+                    WHEN 'left'     THEN inv.left_item   = CAST(:iid AS uuid)
+                    WHEN 'right'    THEN inv.right_item  = CAST(:iid AS uuid)
+                    WHEN 'hidden'   THEN inv.hidden_slot = CAST(:iid AS uuid)
+               END
+        ON CONFLICT (container_item_id, slot_x, slot_y) DO NOTHING
+        RETURNING item_id
+    ),
+    clr AS (
+        UPDATE inventories
+           SET left_item   = CASE WHEN :source = 'left'   THEN NULL ELSE left_item END,
+               right_item  = CASE WHEN :source = 'right'  THEN NULL ELSE right_item END,
+               hidden_slot = CASE WHEN :source = 'hidden' THEN NULL ELSE hidden_slot END,
+               backpack    = CASE WHEN :source = 'backpack'
+                                  THEN array_remove(backpack, CAST(:iid AS uuid))
+                                  ELSE backpack END
+         WHERE actor_id = :aid AND EXISTS (SELECT 1 FROM ins)
+    )
+    SELECT count(*) FROM ins
     """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    if not r:
-        return False
-    return int(r["gw"]) > 0 and int(r["gh"]) > 0
+)
 
 
 async def grid_put_item_db(
@@ -991,8 +909,15 @@ async def grid_put_item_db(
     source_place: str,  # 'left'|'right'|'hidden'|'backpack'
     item_id: str,
 ):
+    chk = (
+        await session.execute(
+            _SQL_GRID_PUT_CHECK,
+            {"aid": actor_id, "cid": container_item_id, "iid": item_id, "source": source_place},
+        )
+    ).mappings().first()
+
     # запрет контейнер-в-контейнер (пока)
-    if await _is_container(session, item_id):
+    if chk["item_is_container"]:
         return {"ok": False, "error": "container_in_container_forbidden"}
 
     # нельзя класть предмет в самого себя
@@ -1004,102 +929,117 @@ async def grid_put_item_db(
         return {"ok": False, "error": "hidden_protected"}
 
     # контейнер должен принадлежать актёру
-    ok, why = await _owns_container(session, actor_id, container_item_id)
-    if not ok:
-        return {"ok": False, "error": why}
+    if not chk["has_inventory"]:
+        return {"ok": False, "error": "no_inventory"}
+    if not chk["owned_as"]:
+        return {"ok": False, "error": "not_owner"}
 
     # контейнер реально имеет grid?
-    cont = await _brief_item(session, container_item_id)
-    gw, gh = int(cont.get("grid_w") or 0), int(cont.get("grid_h") or 0)
+    gw, gh = int(chk["grid_w"]), int(chk["grid_h"])
     if gw <= 0 or gh <= 0:
         return {"ok": False, "error": "not_a_container"}
     if not (0 <= slot_x < gw and 0 <= slot_y < gh):
         return {"ok": False, "error": "out_of_bounds"}
 
-    # слот свободен?
-    exists = (
-        await session.execute(
-            text(
-                """
-        SELECT 1 FROM carried_container_slots
-         WHERE container_item_id = :cid AND slot_x=:x AND slot_y=:y
-         LIMIT 1
-    """
-            ),
-            {"cid": container_item_id, "x": slot_x, "y": slot_y},
-        )
-    ).scalar()
-    if exists:
-        return {"ok": False, "error": "slot_busy"}
-
     # предмет действительно у игрока в source_place?
-    if source_place == "backpack":
-        in_src = (
-            await session.execute(
-                text(
-                    """
-            SELECT CAST(:iid AS uuid) = ANY(coalesce(backpack,'{}'::uuid[])) AS ok
-              FROM inventories WHERE actor_id=:aid
-        """
-                ),
-                {"iid": item_id, "aid": actor_id},
-            )
-        ).scalar()
-    elif source_place in ("left", "right", "hidden"):
-        col = "left_item" if source_place == "left" else "right_item" if source_place == "right" else "hidden_slot"
-        in_src = (
-            await session.execute(
-                text(
-                    f"""
-            SELECT ({col} = CAST(:iid AS uuid)) AS ok
-              FROM inventories WHERE actor_id=:aid
-        """
-                ),
-                {"iid": item_id, "aid": actor_id},
-            )
-        ).scalar()
-    else:
+    if source_place not in ("backpack", "left", "right", "hidden"):
         return {"ok": False, "error": "bad_source"}
 
-    if not in_src:
+    if not chk["in_source"]:
         return {"ok": False, "error": "item_not_in_source"}
 
-    # 1) удаляем из source_place
-    if source_place == "backpack":
+    # кладём в слот и удаляем из source_place; слот занят — ничего не вставилось
+    placed = (
         await session.execute(
-            text(
-                """
-            UPDATE inventories
-               SET backpack = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id=:aid
-        """
-            ),
-            {"iid": item_id, "aid": actor_id},
+            _SQL_GRID_PUT_MOVE,
+            {"aid": actor_id, "cid": container_item_id, "x": slot_x, "y": slot_y, "iid": item_id, "source": source_place},
         )
-    elif source_place == "left":
-        await session.execute(text("""UPDATE inventories SET left_item=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif source_place == "right":
-        await session.execute(text("""UPDATE inventories SET right_item=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif source_place == "hidden":
-        # сюда не дойдём (protected), оставлено для симметрии
-        await session.execute(text("""UPDATE inventories SET hidden_slot=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-
-    # 2) кладём в слот
-    await session.execute(
-        text(
-            """
-        INSERT INTO carried_container_slots(container_item_id, slot_x, slot_y, item_id)
-        VALUES (CAST(:cid AS uuid), :x, :y, CAST(:iid AS uuid))
-        ON CONFLICT (container_item_id, slot_x, slot_y) DO NOTHING
-    """
-        ),
-        {"cid": container_item_id, "x": slot_x, "y": slot_y, "iid": item_id},
-    )
+    ).scalar()
+    if not placed:
+        return {"ok": False, "error": "slot_busy"}
 
-    await session.commit()
     return {"ok": True}
 
 
+# Забрать предмет из слота: DELETE слота и запись в target (двуручный в руку
+# занимает обе) — один запрос. Строка инвентаря блокируется вместе с проверкой
+# target (рука/тайник свободны), слот удаляется только если проверка прошла.
+# Возвращает item_id перенесённого предмета или ничего.
+_SQL_GRID_TAKE_MOVE = text(
+    """
+    WITH it AS (
+        SELECT s.item_id, coalesce(k.handedness, 'one_hand') = 'two_hands' AS two_hands
+          FROM carried_container_slots s
+          LEFT JOIN items i ON i.id = s.item_id
+          LEFT JOIN item_kinds k ON k.id = i.kind_id
+         WHERE s.container_item_id = :cid AND s.slot_x = :x AND s.slot_y = :y
+    ),
+    free AS (
+        SELECT t.actor_id
+          FROM inventories t, it
+         WHERE t.actor_id = :aid
+           AND CASE :target
+                    WHEN 'left'   THEN t.left_item IS NULL AND (NOT it.two_hands OR t.right_item IS NULL)
+                    WHEN 'right'  THEN t.right_item IS NULL AND (NOT it.two_hands OR t.left_item IS NULL)
+                    WHEN 'hidden' THEN t.hidden_slot IS NULL
+                    ELSE true
+               END
+           FOR UPDATE OF t
+    ),
+    del AS (
+        DELETE FROM carried_container_slots s
+         USING free
+         WHERE s.container_item_id = :cid AND s.slot_x = :x AND s.slot_y = :y
+        RETURNING s.item_id
+    )
+    UPDATE inventories t
+       SET left_item   = CASE WHEN :target = 'left' OR (:target = 'right' AND it.two_hands)
+                              THEN it.item_id ELSE t.left_item END,
+           right_item  = CASE WHEN :target = 'right' OR (:target = 'left' AND it.two_hands)
+                              THEN it.item_id ELSE t.right_item END,
+           hidden_slot = CASE WHEN :target = 'hidden' THEN it.item_id ELSE t.hidden_slot END,
+           backpack    = CASE WHEN :target = 'backpack'
+                              THEN array_append(t.backpack, it.item_id)
+                              ELSE t.backpack END
+      FROM del
+      JOIN it ON it.item_id = del.item_id
+     WHERE t.actor_id = :aid
+    RETURNING it.item_id
+    """
+)
+
+# Ошибка, если _SQL_GRID_TAKE_MOVE ничего не перенёс (target заняли между проверкой и записью)
+_TAKE_TARGET_BUSY = {
+    "left": "hand_occupied",
+    "right": "hand_occupied",
+    "hidden": "hidden_busy",
+    "backpack": "slot_empty",
+}
+
+
+# Все чтения grid_take_item_db одним запросом: владение контейнером, предмет
+# в слоте с его handedness и занятость рук/тайника. Нет строки — нет инвентаря.
+# Строка инвентаря блокируется до commit (как в _SQL_GRID_PUT_CHECK).
+_SQL_GRID_TAKE_CHECK = text(
+    """
+    SELECT inv.left_item, inv.right_item, inv.hidden_slot,
+           CASE CAST(:cid AS uuid)
+                WHEN inv.equipped_bag THEN 'equipped'
+                WHEN inv.left_item THEN 'left'
+                WHEN inv.right_item THEN 'right'
+           END AS owned_as,
+           s.item_id, coalesce(k.handedness, 'one_hand') AS handedness
+      FROM inventories inv
+      LEFT JOIN carried_container_slots s
+        ON s.container_item_id = CAST(:cid AS uuid) AND s.slot_x = :x AND s.slot_y = :y
+      LEFT JOIN items i ON i.id = s.item_id
+      LEFT JOIN item_kinds k ON k.id = i.kind_id
+     WHERE inv.actor_id = :aid
+       FOR UPDATE OF inv
+    """
+)
+
+
 async def grid_take_item_db(
     session: AsyncSession,
     actor_id: str,
@@ -1108,41 +1048,29 @@ async def grid_take_item_db(
     slot_y: int,
     target_place: str,  # 'left'|'right'|'hidden'|'backpack'
 ):
-    ok, why = await _owns_container(session, actor_id, container_item_id)
-    if not ok:
-        return {"ok": False, "error": why}
-
-    # берём предмет из слота
-    row = (
-        await session.execute(
-            text(
-                """
-        SELECT item_id
-          FROM carried_container_slots
-         WHERE container_item_id=:cid AND slot_x=:x AND slot_y=:y
-    """
-            ),
-            {"cid": container_item_id, "x": slot_x, "y": slot_y},
-        )
-    ).mappings().first()
-    if not row or not row["item_id"]:
-        return {"ok": False, "error": "slot_empty"}
-
-    iid = row["item_id"]
-
-    # проверка таргета
     inv = (
         await session.execute(
-            text("""SELECT left_item, right_item, hidden_slot FROM inventories WHERE actor_id=:aid"""),
-            {"aid": actor_id},
+            _SQL_GRID_TAKE_CHECK,
+            {"aid": actor_id, "cid": container_item_id, "x": slot_x, "y": slot_y},
         )
     ).mappings().first()
+    if not inv:
+        return {"ok": False, "error": "no_inventory"}
+    if not inv["owned_as"]:
+        return {"ok": False, "error": "not_owner"}
+
+    # предмет в слоте
+    if not inv["item_id"]:
+        return {"ok": False, "error": "slot_empty"}
 
+    iid = inv["item_id"]
+
+    # проверка таргета
     if target_place in ("left", "right"):
         if inv[f"{target_place}_item"]:
             return {"ok": False, "error": "hand_occupied"}
         # двуручный нельзя класть в одну руку
-        if await _handedness(session, iid) == "two_hands":
+        if inv["handedness"] == "two_hands":
             if inv["left_item"] or inv["right_item"]:
                 return {"ok": False, "error": "need_both_hands_free"}
 
@@ -1152,151 +1080,137 @@ async def grid_take_item_db(
     if target_place not in ("left", "right", "hidden", "backpack"):
         return {"ok": False, "error": "bad_target"}
 
-    # 1) очищаем слот
-    await session.execute(
-        text(
-            """
-        DELETE FROM carried_container_slots
-         WHERE container_item_id=:cid AND slot_x=:x AND slot_y=:y
-    """
-        ),
-        {"cid": container_item_id, "x": slot_x, "y": slot_y},
-    )
-
-    # 2) кладём в target
-    if target_place == "left":
-        # если двуручный — занимаем обе руки
-        if await _handedness(session, iid) == "two_hands":
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET left_item=CAST(:iid AS uuid), right_item=CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-            """
-                ),
-                {"iid": iid, "aid": actor_id},
-            )
-        else:
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET left_item=CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-            """
-                ),
-                {"iid": iid, "aid": actor_id},
-            )
-    elif target_place == "right":
-        if await _handedness(session, iid) == "two_hands":
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET left_item=CAST(:iid AS uuid), right_item=CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-            """
-                ),
-                {"iid": iid, "aid": actor_id},
-            )
-        else:
-            await session.execute(
-                text(
-                    """
-                UPDATE inventories SET right_item=CAST(:iid AS uuid)
-                 WHERE actor_id=:aid
-            """
-                ),
-                {"iid": iid, "aid": actor_id},
-            )
-    elif target_place == "hidden":
+    # очищаем слот и кладём предмет в target одним запросом; запрос сам
+    # перепроверяет слот и target — если их успели занять, ничего не меняется
+    moved = (
         await session.execute(
-            text(
-                """
-            UPDATE inventories SET hidden_slot=CAST(:iid AS uuid)
-             WHERE actor_id=:aid
-        """
-            ),
-            {"iid": iid, "aid": actor_id},
-        )
-    elif target_place == "backpack":
-        await session.execute(
-            text(
-                """
-            UPDATE inventories SET backpack = array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id=:aid
-        """
-            ),
-            {"iid": iid, "aid": actor_id},
+            _SQL_GRID_TAKE_MOVE,
+            {"cid": container_item_id, "x": slot_x, "y": slot_y, "target": target_place, "aid": actor_id},
         )
+    ).scalar()
+    if not moved:
+        return {"ok": False, "error": _TAKE_TARGET_BUSY[target_place]}
 
-    await session.commit()
     return {"ok": True, "moved": str(iid)}
 
 
 # ===================== NEAREST FREE CELL FOR DROP =====================
-async def _is_cell_free(session: AsyncSession, node_id: str, x: int, y: int, layer: int = 3) -> bool:
-    row = (
-        await session.execute(
-            text(
-                """select 1 from node_objects where node_id=:nid and x=:x and y=:y and layer=:layer limit 1"""
-            ),
-            {"nid": node_id, "x": x, "y": y, "layer": layer},
-        )
-    ).first()
-    return row is None
+# Ближайшая свободная клетка (нет объекта на слое) одним запросом. Порядок обхода
+# прежний: по кольцам d = 0..r; в кольце сначала верх/низ (|dy| = d) слева направо,
+# для каждого x сначала верх, затем боковые сверху вниз, для каждого y сначала лево.
+_SQL_NEAREST_FREE_CELL = text(
+    """
+    SELECT c.x, c.y
+      FROM (
+            SELECT CAST(:x AS int) + dx AS x, CAST(:y AS int) + dy AS y,
+                   dx, dy, GREATEST(abs(dx), abs(dy)) AS d
+              FROM generate_series(-CAST(:r AS int), CAST(:r AS int)) AS dx,
+                   generate_series(-CAST(:r AS int), CAST(:r AS int)) AS dy
+           ) c
+     WHERE NOT EXISTS (
+            SELECT 1 FROM node_objects o
+             WHERE o.node_id = :nid AND o.x = c.x AND o.y = c.y AND o.layer = :layer
+           )
+     ORDER BY c.d,
+              abs(c.dy) < c.d,
+              CASE WHEN abs(c.dy) = c.d THEN c.dx ELSE c.dy END,
+              CASE WHEN abs(c.dy) = c.d THEN c.dy ELSE c.dx END
+     LIMIT 1
+    """
+)
 
 
 async def _find_nearest_free_cell(
     session: AsyncSession, node_id: str, x: int, y: int, layer: int = 3, max_radius: int = 5
 ) -> Optional[Tuple[int, int]]:
-    # сначала пробуем там же
-    if await _is_cell_free(session, node_id, x, y, layer):
-        return x, y
-    # по кольцам вокруг
-    for r in range(1, max_radius + 1):
-        # верх/низ
-        for cx in range(x - r, x + r + 1):
-            for cy in (y - r, y + r):
-                if await _is_cell_free(session, node_id, cx, cy, layer):
-                    return cx, cy
-        # боковые
-        for cy in range(y - r + 1, y + r):
-            for cx in (x - r, x + r):
-                if await _is_cell_free(session, node_id, cx, cy, layer):
-                    return cx, cy
-    return None
+    row = (
+        await session.execute(
+            _SQL_NEAREST_FREE_CELL,
+            {"nid": node_id, "x": x, "y": y, "r": max_radius, "layer": layer},
+        )
+    ).first()
+    return (row[0], row[1]) if row else None
 
 
 # ===================== HIDDEN & GENERIC DROP TO GROUND =====================
+# Всё для drop_to_ground_db одним чтением: инвентарь, позиция актёра
+# (node_id NULL — актёра нет), предмет из source (item_id или текущий в ячейке)
+# и его kind для выбора asset_id. Строки нет — инвентаря нет. Строка инвентаря
+# блокируется до commit, так что source не опустеет между чтением и дропом.
+_SQL_DROP_CHECK = text(
+    """
+    WITH src AS (
+        SELECT inv.actor_id,
+               CASE :source
+                    WHEN 'left'         THEN coalesce(CAST(:iid AS uuid), inv.left_item)
+                    WHEN 'right'        THEN coalesce(CAST(:iid AS uuid), inv.right_item)
+                    WHEN 'hidden'       THEN coalesce(CAST(:iid AS uuid), inv.hidden_slot)
+                    WHEN 'equipped_bag' THEN coalesce(CAST(:iid AS uuid), inv.equipped_bag)
+                    ELSE CAST(:iid AS uuid)
+               END AS item_id,
+               inv.backpack @> ARRAY[CAST(:iid AS uuid)] AS in_backpack
+          FROM inventories inv
+         WHERE inv.actor_id = :aid
+           FOR UPDATE
+    )
+    SELECT src.item_id, src.in_backpack,
+           a.node_id, COALESCE(a.x,0) AS x, COALESCE(a.y,0) AS y,
+           k.id AS kind_id, k.props
+      FROM src
+      LEFT JOIN actors a ON a.id = src.actor_id
+      LEFT JOIN items i ON i.id = src.item_id
+      LEFT JOIN item_kinds k ON k.id = i.kind_id
+    """
+)
+
+# Дроп одним запросом: освобождаем source, создаём лут-объект (layer=3, открытый)
+# и кладём предмет в его инвентарь. Возвращает id объекта.
+_SQL_DROP_TO_GROUND = text(
+    """
+    WITH clr AS (
+        UPDATE inventories
+           SET left_item    = CASE WHEN :source = 'left'         THEN NULL ELSE left_item END,
+               right_item   = CASE WHEN :source = 'right'        THEN NULL ELSE right_item END,
+               hidden_slot  = CASE WHEN :source = 'hidden'       THEN NULL ELSE hidden_slot END,
+               equipped_bag = CASE WHEN :source = 'equipped_bag' THEN NULL ELSE equipped_bag END,
+               backpack     = CASE WHEN :source = 'backpack'
+                                   THEN array_remove(backpack, CAST(:iid AS uuid))
+                                   ELSE backpack END
+         WHERE actor_id = :aid
+    ),
+    obj AS (
+        INSERT INTO node_objects(node_id, asset_id, x, y, rotation, layer, props)
+        VALUES (:nid, :asset, :x, :y, 0, 3, '{"state":"open"}'::jsonb)
+        RETURNING id
+    ),
+    oi AS (
+        INSERT INTO object_inventories(object_id, items)
+        SELECT id, ARRAY[CAST(:iid AS uuid)] FROM obj
+        ON CONFLICT (object_id) DO UPDATE
+          SET items = object_inventories.items || excluded.items
+    )
+    SELECT id FROM obj
+    """
+)
+
+
 # --- helper: выбираем asset_id для "лежит на полу"
-async def _drop_asset_id(session: AsyncSession, item_id: str) -> str:
+def _drop_asset_id(kind_id: Optional[str], props: Optional[Dict[str, Any]]) -> str:
     """
     Возвращает asset_id для лут-объекта на полу на основе kind.props.ui или kind_id.
     Если в props.ui есть строка (например 'sack'|'backpack'), вернём 'drop_<ui>'.
     Иначе вернём 'dropped_loot' по умолчанию.
     """
-    row = (
-        await session.execute(
-            text(
-                """
-        SELECT k.id AS kind_id, k.props
-          FROM items i
-          JOIN item_kinds k ON k.id = i.kind_id
-         WHERE i.id = :iid
-    """
-            ),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    if not row:
+    if not kind_id:
         return "dropped_loot"
-    props = row.get("props") or {}
+    props = props or {}
     ui = None
     if isinstance(props, dict):
         ui = props.get("ui")
     if isinstance(ui, str) and ui:
         return f"drop_{ui}"
     # fallback по виду предмета
-    kid = (row.get("kind_id") or "").lower()
+    kid = kind_id.lower()
     if "sack" in kid or "bag" in kid or "backpack" in kid:
         return "drop_bag"
     return "dropped_loot"
@@ -1306,7 +1220,7 @@ async def drop_to_ground_db(
     session: AsyncSession,
     actor_id: str,
     source: str,         # 'left'|'right'|'hidden'|'backpack'|'equipped_bag'
-    item_id: Optional[str] = None
+    item_id: Optional[str] = None,
 ):
     """
     Универсальный дроп из указанного источника на клетку актёра (слой L3).
@@ -1314,129 +1228,52 @@ async def drop_to_ground_db(
     Для остальных источников item_id можно опустить — возьмём текущий.
     Контейнеры (мешок/рюкзак) падают НА ПОЛ СО СВОИМ СОДЕРЖИМЫМ (слоты не чистим).
     """
-    # 0) инвентарь и позиция
-    inv = (
-        await session.execute(
-            text(
-                """
-        SELECT left_item, right_item, hidden_slot, equipped_bag, backpack
-          FROM inventories WHERE actor_id=:aid
-    """
-            ),
-            {"aid": actor_id},
-        )
+    # 0) инвентарь, позиция и предмет источника
+    row = (
+        await session.execute(_SQL_DROP_CHECK, {"aid": actor_id, "source": source, "iid": item_id})
     ).mappings().first()
-    if not inv:
+    if not row:
         return {"ok": False, "error": "no_inventory"}
 
-    pos = (
-        await session.execute(
-            text(
-                """
-        SELECT node_id, COALESCE(x,0) AS x, COALESCE(y,0) AS y
-          FROM actors WHERE id=:aid
-    """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not pos or not pos["node_id"]:
+    if not row["node_id"]:
         return {"ok": False, "error": "no_actor_position"}
 
-    node_id, x, y = pos["node_id"], int(pos["x"]), int(pos["y"])
+    node_id, x, y = row["node_id"], int(row["x"]), int(row["y"])
 
     # 1) определяем item_id и валидируем источник
     src = source
     if src not in ("left", "right", "hidden", "backpack", "equipped_bag"):
         return {"ok": False, "error": "bad_source"}
 
-    if src == "left":
-        item_id = item_id or inv["left_item"]
-    elif src == "right":
-        item_id = item_id or inv["right_item"]
-    elif src == "hidden":
-        item_id = item_id or inv["hidden_slot"]
-    elif src == "equipped_bag":
-        item_id = item_id or inv["equipped_bag"]
-    elif src == "backpack":
+    if src == "backpack":
         if not item_id:
             return {"ok": False, "error": "item_id_required"}
-        in_bp = (
-            await session.execute(
-                text(
-                    """
-            SELECT CAST(:iid AS uuid) = ANY(coalesce(backpack,'{}'::uuid[])) AS ok
-              FROM inventories WHERE actor_id=:aid
-        """
-                ),
-                {"iid": item_id, "aid": actor_id},
-            )
-        ).scalar()
-        if not in_bp:
+        if not row["in_backpack"]:
             return {"ok": False, "error": "not_in_backpack"}
 
+    item_id = row["item_id"]
     if not item_id:
         return {"ok": False, "error": "source_empty"}
 
-    # 2) освобождаем источник
-    if src == "left":
-        await session.execute(text("""UPDATE inventories SET left_item=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif src == "right":
-        await session.execute(text("""UPDATE inventories SET right_item=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif src == "hidden":
-        # единственный разрешённый способ вынести из защищённой hidden
-        await session.execute(text("""UPDATE inventories SET hidden_slot=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif src == "equipped_bag":
-        await session.execute(text("""UPDATE inventories SET equipped_bag=NULL WHERE actor_id=:aid"""), {"aid": actor_id})
-    elif src == "backpack":
-        await session.execute(
-            text(
-                """
-            UPDATE inventories
-               SET backpack = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-             WHERE actor_id=:aid
-        """
-            ),
-            {"aid": actor_id, "iid": item_id},
-        )
-
-    # 3) ищем ближайшую свободную клетку на слое L3
+    # 2) ищем ближайшую свободную клетку на слое L3 (до записи — откатывать нечего)
     pos_free = await _find_nearest_free_cell(session, node_id, x, y, layer=3, max_radius=5)
     if not pos_free:
-        await session.rollback()
         return {"ok": False, "error": "no_free_cell_nearby"}
     drop_x, drop_y = pos_free
 
-    # 4) создаём лут-ассет
-    asset_id = await _drop_asset_id(session, item_id)
-    obj = (
+    # 3) освобождаем источник, создаём лут-ассет и кладём предмет внутрь
+    asset_id = _drop_asset_id(row["kind_id"], row["props"])
+    object_id = (
         await session.execute(
-            text(
-                """
-        INSERT INTO node_objects(node_id, asset_id, x, y, rotation, layer, props)
-        VALUES (:nid, :asset, :x, :y, 0, 3, '{"state":"open"}'::jsonb)
-        RETURNING id
-    """
-            ),
-            {"nid": node_id, "asset": asset_id, "x": drop_x, "y": drop_y},
+            _SQL_DROP_TO_GROUND,
+            {
+                "aid": actor_id, "source": src, "iid": item_id,
+                "nid": node_id, "asset": asset_id, "x": drop_x, "y": drop_y,
+            },
         )
-    ).mappings().first()
-    object_id = obj["id"]
-
-    # 5) создаём/обновляем инвентарь объекта: кладём предмет внутрь
-    await session.execute(
-        text(
-            """
-        INSERT INTO object_inventories(object_id, items)
-        VALUES (:oid, ARRAY[CAST(:iid AS uuid)])
-        ON CONFLICT (object_id) DO UPDATE
-          SET items = object_inventories.items || ARRAY[CAST(:iid AS uuid)]
-    """
-        ),
-        {"oid": object_id, "iid": item_id},
-    )
+    ).scalar()
+    _invalidate_los(session, node_id)
 
-    await session.commit()
     return {
         "ok": True,
         "object_id": object_id,
@@ -1452,74 +1289,38 @@ async def drop_hidden_to_ground_db(session: AsyncSession, actor_id: str):
     Выбросить предмет из защищённой ячейки hidden_slot на землю.
     Делает маленький лут-объект (layer=3) и кладёт туда предмет через object_inventories.
     """
-    # 1) есть ли предмет в hidden?
-    inv = (
-        await session.execute(
-            text("""SELECT hidden_slot FROM inventories WHERE actor_id=:aid"""),
-            {"aid": actor_id},
-        )
+    # 1) предмет в hidden и позиция актёра — тем же чтением, что и drop_to_ground_db
+    row = (
+        await session.execute(_SQL_DROP_CHECK, {"aid": actor_id, "source": "hidden", "iid": None})
     ).mappings().first()
-    if not inv or not inv["hidden_slot"]:
+    if not row or not row["item_id"]:
         return {"ok": False, "error": "hidden_empty"}
 
-    item_id = inv["hidden_slot"]
-
-    # 2) позиция актёра
-    pos = (
-        await session.execute(
-            text(
-                """
-        SELECT node_id, COALESCE(x,0) AS x, COALESCE(y,0) AS y
-          FROM actors WHERE id=:aid
-    """
-            ),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
+    item_id = row["item_id"]
 
-    if not pos or not pos["node_id"]:
+    if not row["node_id"]:
         return {"ok": False, "error": "no_actor_position"}
 
-    node_id, x, y = pos["node_id"], int(pos["x"]), int(pos["y"])
+    node_id, x, y = row["node_id"], int(row["x"]), int(row["y"])
 
-    # 3) найдём ближайшую свободную L3 клетку
+    # 2) найдём ближайшую свободную L3 клетку
     pos_free = await _find_nearest_free_cell(session, node_id, x, y, layer=3, max_radius=5)
     if not pos_free:
         return {"ok": False, "error": "no_free_cell_nearby"}
     drop_x, drop_y = pos_free
 
-    # 4) создаём объект лута (layer=3, открытый)
-    obj = (
+    # 3) очищаем hidden_slot, создаём лут-объект и кладём предмет внутрь
+    obj_id = (
         await session.execute(
-            text(
-                """
-        INSERT INTO node_objects(node_id, asset_id, x, y, rotation, layer, props)
-        VALUES (:nid, :asset, :x, :y, 0, 3, '{"state":"open"}'::jsonb)
-        RETURNING id
-    """
-            ),
-            {"nid": node_id, "asset": "dropped_loot", "x": drop_x, "y": drop_y},
+            _SQL_DROP_TO_GROUND,
+            {
+                "aid": actor_id, "source": "hidden", "iid": item_id,
+                "nid": node_id, "asset": "dropped_loot", "x": drop_x, "y": drop_y,
+            },
         )
-    ).mappings().first()
-    obj_id = obj["id"]
-
-    # 5) создаём инвентарь объекта и положим туда предмет
-    await session.execute(
-        text(
-            """
-        INSERT INTO object_inventories(object_id, items)
-        VALUES (:oid, ARRAY[CAST(:iid AS uuid)])
-        ON CONFLICT (object_id) DO UPDATE
-          SET items = object_inventories.items || ARRAY[CAST(:iid AS uuid)]
-    """
-        ),
-        {"oid": obj_id, "iid": item_id},
-    )
-
-    # 6) очищаем hidden_slot
-    await session.execute(text("""UPDATE inventories SET hidden_slot = NULL WHERE actor_id=:aid"""), {"aid": actor_id})
+    ).scalar()
+    _invalidate_los(session, node_id)
 
-    await session.commit()
     return {"ok": True, "object_id": obj_id, "dropped": str(item_id), "node_id": node_id, "x": drop_x, "y": drop_y}
 # ===================== AMMO / CONSUMABLES (DAO) =====================
 
@@ -1528,52 +1329,44 @@ async def drop_hidden_to_ground_db(session: AsyncSession, actor_id: str):
 #   items.charges (у тебя есть)
 # И есть справочник ammo_types(id, ...). Если FK не хочешь — можно без неё.
 
-async def _get_item_with_kind(session: AsyncSession, item_id: str):
-    """Тянем предмет + поля его kind, нужные для логики зарядов/расходников."""
-    row = (
-        await session.execute(
-            text("""
-                SELECT i.id, i.kind_id, i.charges, i.durability,
-                       k.title, k.tags, k.handedness, k.props,
-                       k.ammo_type, k.max_charges, k.range_cells, k.use_effect
-                  FROM items i
-                  JOIN item_kinds k ON k.id = i.kind_id
-                 WHERE i.id = :iid
-            """),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    return dict(row) if row else None
-
+# горячее точечное чтение (каждый выстрел/расход) — через _pg_fetchrow
+_PG_ITEM_WITH_KIND = """
+    SELECT i.id, i.kind_id, i.charges, i.durability,
+           k.title, k.tags, k.handedness, k.props,
+           k.ammo_type, k.max_charges, k.range_cells, k.use_effect
+      FROM items i
+      JOIN item_kinds k ON k.id = i.kind_id
+     WHERE i.id = $1::uuid
+"""
 
-async def _delete_item_everywhere(session: AsyncSession, item_id: str):
+_SQL_CONSUME_CHARGE = text(
     """
-    Полное удаление предмета с очисткой всех ссылок.
-    Используется при выработке расходника или расходе патронов-предметов.
+    UPDATE items SET charges = charges - :a WHERE id=:iid RETURNING charges
     """
-    # очистка из инвентарей актёров
-    await session.execute(text("""
-        UPDATE inventories
-           SET left_item    = CASE WHEN left_item    = CAST(:iid AS uuid) THEN NULL ELSE left_item END,
-               right_item   = CASE WHEN right_item   = CAST(:iid AS uuid) THEN NULL ELSE right_item END,
-               hidden_slot  = CASE WHEN hidden_slot  = CAST(:iid AS uuid) THEN NULL ELSE hidden_slot END,
-               equipped_bag = CASE WHEN equipped_bag = CAST(:iid AS uuid) THEN NULL ELSE equipped_bag END,
-               backpack     = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-    """), {"iid": item_id})
-
-    # очистка из переносимых контейнеров
-    await session.execute(text("""
-        DELETE FROM carried_container_slots WHERE item_id = CAST(:iid AS uuid)
-    """), {"iid": item_id})
-
-    # очистка из контейнеров на земле
-    await session.execute(text("""
-        UPDATE object_inventories
-           SET items = array_remove(items, CAST(:iid AS uuid))
-    """), {"iid": item_id})
+)
+
+
+# То же для reload_weapon_db, но с блокировкой оружия и инвентаря актёра до
+# commit: параллельные перезарядки не читают один и тот же остаток магазина
+# и пачек. $2 — actor_id.
+_PG_RELOAD_WEAPON_ITEM = """
+    SELECT i.id, i.kind_id, i.charges, i.durability,
+           k.title, k.tags, k.handedness, k.props,
+           k.ammo_type, k.max_charges, k.range_cells, k.use_effect
+      FROM items i
+      JOIN item_kinds k ON k.id = i.kind_id
+      LEFT JOIN LATERAL (
+            SELECT 1 FROM inventories WHERE actor_id = $2 FOR UPDATE
+           ) lk ON true
+     WHERE i.id = $1::uuid
+       FOR UPDATE OF i
+"""
+
 
-    # сам предмет
-    await session.execute(text("DELETE FROM items WHERE id = :iid"), {"iid": item_id})
+async def _get_item_with_kind(session: AsyncSession, item_id: str):
+    """Тянем предмет + поля его kind, нужные для логики зарядов/расходников."""
+    row = await _pg_fetchrow(session, _PG_ITEM_WITH_KIND, item_id)
+    return dict(row) if row else None
 
 
 async def consume_charge_db(session: AsyncSession, item_id: str, amount: int = 1):
@@ -1594,16 +1387,90 @@ async def consume_charge_db(session: AsyncSession, item_id: str, amount: int = 1
     if int(charges or 0) < amount:
         return {"ok": False, "error": "empty", "left": int(charges or 0)}
 
-    new_row = (
-        await session.execute(
-            text("""UPDATE items SET charges = charges - :a WHERE id=:iid RETURNING charges"""),
-            {"a": amount, "iid": item_id},
-        )
-    ).mappings().first()
-    left = int(new_row["charges"] if new_row and new_row["charges"] is not None else 0)
+    left = int(await session.scalar(_SQL_CONSUME_CHARGE, {"a": amount, "iid": item_id}) or 0)
     return {"ok": True, "left": left}
 
 
+# Перезарядка одним запросом. Пачки нужного типа берутся из рюкзака в его
+# порядке; нарастающая сумма зарядов решает, сколько снять с каждой пачки.
+# Опустевшие пачки удаляются вместе со всеми ссылками на них (руки, рюкзаки,
+# слоты контейнеров, контейнеры на земле), сумма уходит в магазин оружия.
+_SQL_RELOAD_WEAPON = text(
+    """
+    WITH bp AS (
+        SELECT b.id, b.ord
+          FROM inventories inv,
+               unnest(inv.backpack) WITH ORDINALITY AS b(id, ord)
+         WHERE inv.actor_id = :aid
+    ),
+    packs AS (
+        SELECT i.id, i.charges, bp.ord,
+               SUM(i.charges) OVER (ORDER BY bp.ord) - i.charges AS before
+          FROM bp
+          JOIN items i ON i.id = bp.id
+          JOIN item_kinds k ON k.id = i.kind_id
+         WHERE k.ammo_type = :atype AND i.charges > 0 AND i.id <> CAST(:wid AS uuid)
+    ),
+    used AS (
+        SELECT id, ord, charges, take
+          FROM (SELECT id, ord, charges,
+                       LEAST(charges, GREATEST(:need - before, 0)) AS take
+                  FROM packs) t
+         WHERE take > 0
+    ),
+    gone AS (
+        SELECT coalesce(array_agg(id), '{}'::uuid[]) AS ids FROM used WHERE take >= charges
+    ),
+    spent AS (
+        UPDATE items t SET charges = t.charges - u.take
+          FROM used u
+         WHERE t.id = u.id AND u.take < u.charges
+    ),
+    inv_clean AS (
+        UPDATE inventories
+           SET left_item    = CASE WHEN left_item    = ANY(gone.ids) THEN NULL ELSE left_item END,
+               right_item   = CASE WHEN right_item   = ANY(gone.ids) THEN NULL ELSE right_item END,
+               hidden_slot  = CASE WHEN hidden_slot  = ANY(gone.ids) THEN NULL ELSE hidden_slot END,
+               equipped_bag = CASE WHEN equipped_bag = ANY(gone.ids) THEN NULL ELSE equipped_bag END,
+               backpack     = ARRAY(SELECT x FROM unnest(backpack) WITH ORDINALITY AS u(x, n)
+                                     WHERE x <> ALL(gone.ids) ORDER BY n)
+          FROM gone
+         WHERE backpack && gone.ids
+            OR ARRAY[left_item, right_item, hidden_slot, equipped_bag] && gone.ids
+    ),
+    slots_clean AS (
+        DELETE FROM carried_container_slots s
+         USING gone
+         WHERE s.item_id = ANY(gone.ids)
+    ),
+    obj_clean AS (
+        UPDATE object_inventories
+           SET items = ARRAY(SELECT x FROM unnest(items) WITH ORDINALITY AS u(x, n)
+                              WHERE x <> ALL(gone.ids) ORDER BY n)
+          FROM gone
+         WHERE items && gone.ids
+    ),
+    del AS (
+        DELETE FROM items t
+         USING gone
+         WHERE t.id = ANY(gone.ids)
+    ),
+    wep AS (
+        UPDATE items t SET charges = COALESCE(t.charges, 0) + s.total
+          FROM (SELECT SUM(take) AS total FROM used) s
+         WHERE t.id = CAST(:wid AS uuid) AND s.total > 0
+        RETURNING t.charges
+    )
+    SELECT (SELECT count(*) FROM bp) AS backpack_size,
+           (SELECT charges FROM wep) AS weapon_charges,
+           (SELECT coalesce(SUM(take), 0) FROM used) AS loaded,
+           (SELECT coalesce(jsonb_agg(jsonb_build_object('ammo_item_id', id, 'taken', take)
+                                      ORDER BY ord), '[]'::jsonb)
+              FROM used) AS used
+    """
+)
+
+
 async def reload_weapon_db(session: AsyncSession, actor_id: str, weapon_item_id: str):
     """
     Перезаряжает оружие из рюкзака патронами нужного типа.
@@ -1613,7 +1480,7 @@ async def reload_weapon_db(session: AsyncSession, actor_id: str, weapon_item_id:
       При нуле — предмет патронов удаляется.
     Возвращает dict с событием RELOAD (для WS), либо ошибку.
     """
-    w = await _get_item_with_kind(session, weapon_item_id)
+    w = await _pg_fetchrow(session, _PG_RELOAD_WEAPON_ITEM, weapon_item_id, actor_id)
     if not w:
         return {"ok": False, "error": "weapon_not_found"}
 
@@ -1630,68 +1497,23 @@ async def reload_weapon_db(session: AsyncSession, actor_id: str, weapon_item_id:
     if cur >= cap:
         return {"ok": False, "error": "already_full", "left": cur}
 
-    # Забираем список id из рюкзака
-    inv = (
+    # Снимаем патроны с пачек, чистим опустевшие и заряжаем — один запрос
+    res = (
         await session.execute(
-            text("""SELECT backpack FROM inventories WHERE actor_id=:aid"""),
-            {"aid": actor_id},
+            _SQL_RELOAD_WEAPON,
+            {"aid": actor_id, "wid": weapon_item_id, "atype": ammo_type, "need": cap - cur},
         )
     ).mappings().first()
-    backpack_ids = [str(x) for x in (inv and inv["backpack"] or [])]
-    if not backpack_ids:
+    if not res["backpack_size"]:
         return {"ok": False, "error": "no_ammo_in_backpack"}
 
-    # Подтянем предметы из рюкзака
-    stmt = text("""
-        SELECT i.id, i.charges, k.ammo_type, k.title
-          FROM items i JOIN item_kinds k ON k.id = i.kind_id
-         WHERE i.id = ANY(:ids)
-    """).bindparams(bindparam("ids", value=backpack_ids, type_=ARRAY(UUID(as_uuid=True))))
-    rows = (await session.execute(stmt)).mappings().all()
-
-    need = cap - cur
-    loaded = 0
-    used_list = []
-
-    for r in rows:
-        if r["ammo_type"] != ammo_type:
-            continue
-        ammo_left = int(r.get("charges") or 0)
-        if ammo_left <= 0 or need <= 0:
-            continue
-
-        take = min(ammo_left, need)
-
-        # Списываем у пачки патронов
-        new_left = (
-            await session.execute(
-                text("""UPDATE items SET charges = charges - :t WHERE id=:iid RETURNING charges"""),
-                {"t": take, "iid": r["id"]},
-            )
-        ).mappings().first()["charges"]
-
-        # Если пачка опустела — удаляем предмет полностью
-        if int(new_left or 0) <= 0:
-            await _delete_item_everywhere(session, str(r["id"]))
-
-        used_list.append({"ammo_item_id": str(r["id"]), "taken": int(take)})
-        loaded += take
-        need -= take
-        if need <= 0:
-            break
-
+    loaded = int(res["loaded"])
     if loaded == 0:
         return {"ok": False, "error": "no_usable_ammo"}
 
-    # Кладём в магазин оружия
-    new_weapon_charges = (
-        await session.execute(
-            text("""UPDATE items SET charges = COALESCE(charges,0) + :add WHERE id=:iid RETURNING charges"""),
-            {"add": loaded, "iid": weapon_item_id},
-        )
-    ).mappings().first()["charges"]
+    new_weapon_charges = res["weapon_charges"]
+    used_list = [{"ammo_item_id": u["ammo_item_id"], "taken": int(u["taken"])} for u in res["used"]]
 
-    await session.commit()
     return {
         "ok": True,
         "loaded": int(loaded),
@@ -1704,6 +1526,53 @@ async def reload_weapon_db(session: AsyncSession, actor_id: str, weapon_item_id:
     }
 
 
+# Использование предмета одним запросом: эффект HEAL_n/BURN_n применяется к hp
+# (BURN — к :tid, если задан, иначе к себе), заряд списывается, последний —
+# удаляет предмет. Возвращает прочитанные до изменений поля для событий.
+_SQL_USE_ITEM_EFFECT = text(
+    """
+    WITH itm AS (
+        SELECT i.id, i.charges, k.title, coalesce(k.use_effect, '') AS use_effect,
+               CASE left(k.use_effect, 5)
+                    WHEN 'HEAL_' THEN 'heal'
+                    WHEN 'BURN_' THEN 'burn'
+               END AS effect_kind
+          FROM items i
+          JOIN item_kinds k ON i.kind_id = k.id
+         WHERE i.id = :iid
+    ),
+    eff AS (
+        SELECT itm.*,
+               CASE WHEN effect_kind IS NOT NULL
+                    THEN CAST(split_part(use_effect, '_', 2) AS int)
+               END AS amount
+          FROM itm
+    ),
+    hp AS (
+        UPDATE actors a
+           SET hp = CASE WHEN eff.effect_kind = 'heal'
+                         THEN LEAST(a.hp + eff.amount, 100)
+                         ELSE GREATEST(a.hp - eff.amount, 0) END
+          FROM eff
+         WHERE eff.effect_kind IS NOT NULL
+           AND a.id = CASE WHEN eff.effect_kind = 'heal' THEN :aid
+                           ELSE coalesce(:tid, :aid) END
+    ),
+    spend AS (
+        UPDATE items t SET charges = t.charges - 1
+          FROM eff
+         WHERE t.id = eff.id AND eff.charges > 1
+    ),
+    del AS (
+        DELETE FROM items t
+         USING eff
+         WHERE t.id = eff.id AND eff.charges <= 1
+    )
+    SELECT title, charges, use_effect, effect_kind, amount FROM eff
+    """
+)
+
+
 async def use_consumable_db(session: AsyncSession, actor_id: str, item_id: str):
     """
     Использование расходника/аптечки/еды.
@@ -1725,100 +1594,35 @@ async def use_item_db(session: AsyncSession, actor_id: str, item_id: str, target
     Если charges > 0 — тратит 1 заряд.
     Если charges <= 0 — удаляет предмет.
     """
-    from sqlalchemy import text
-
-    # достаём предмет и его kind
-    q = await session.execute(text("""
-        SELECT i.id, i.charges, k.title, k.use_effect
-        FROM items i
-        JOIN item_kinds k ON i.kind_id = k.id
-        WHERE i.id = :iid
-    """), {"iid": item_id})
-    item = q.mappings().first()
+    item = (
+        await session.execute(_SQL_USE_ITEM_EFFECT, {"iid": item_id, "aid": actor_id, "tid": target_id})
+    ).mappings().first()
     if not item:
         return [{"type": "TEXT", "payload": {"text": "Предмет не найден."}}]
 
     events = []
-    use_effect = item["use_effect"] or ""
-
-    # --- обработка эффектов ---
-    if use_effect.startswith("HEAL_"):
-        heal_amount = int(use_effect.split("_")[1])
-        await session.execute(text("""
-            UPDATE actors SET hp = LEAST(hp + :heal, 100) WHERE id = :aid
-        """), {"aid": actor_id, "heal": heal_amount})
-        events.append({"type": "ITEM_USE", "payload": {"effect": "heal", "amount": heal_amount}})
-
-    elif use_effect.startswith("BURN_"):
-        dmg = int(use_effect.split("_")[1])
-        target = target_id or actor_id
-        await session.execute(text("""
-            UPDATE actors SET hp = GREATEST(hp - :dmg, 0) WHERE id = :tid
-        """), {"tid": target, "dmg": dmg})
-        events.append({"type": "ITEM_USE", "payload": {"effect": "burn", "amount": dmg}})
+    use_effect = item["use_effect"]
 
+    # --- эффекты (hp уже изменён запросом) ---
+    if item["effect_kind"] == "heal":
+        events.append({"type": "ITEM_USE", "payload": {"effect": "heal", "amount": item["amount"]}})
+    elif item["effect_kind"] == "burn":
+        events.append({"type": "ITEM_USE", "payload": {"effect": "burn", "amount": item["amount"]}})
     elif use_effect:
         events.append({"type": "ITEM_USE", "payload": {"effect": use_effect}})
     else:
         events.append({"type": "TEXT", "payload": {"text": "Ничего не произошло."}})
 
-    # --- расход зарядов ---
+    # --- расход зарядов (тоже уже в запросе) ---
     if item["charges"] is not None:
         if item["charges"] > 1:
-            await session.execute(text("UPDATE items SET charges = charges - 1 WHERE id = :iid"), {"iid": item_id})
             events.append({"type": "CONSUME", "payload": {"item": item["title"], "delta": -1, "left": item["charges"] - 1}})
         else:
-            await session.execute(text("DELETE FROM items WHERE id = :iid"), {"iid": item_id})
             events.append({"type": "ITEM_DESTROYED", "payload": {"item": item["title"]}})
 
-    await session.commit()
     return events
 
 
-    it = await _get_item_with_kind(session, item_id)
-    if not it:
-        return {"ok": False, "error": "item_not_found"}
-
-    effect = it.get("use_effect")
-    if not effect:
-        return {"ok": False, "error": "not_consumable"}
-
-    events: List[Dict[str, Any]] = []
-
-    # Примитивные эффекты на старте главы: HEAL_XX
-    if effect.startswith("HEAL_"):
-        try:
-            heal = int(effect.split("_")[1])
-        except Exception:
-            heal = 0
-        if heal > 0:
-            row = (
-                await session.execute(
-                    text("""UPDATE actors SET hp = LEAST(100, COALESCE(hp,0) + :h) WHERE id=:aid RETURNING hp"""),
-                    {"h": heal, "aid": actor_id},
-                )
-            ).mappings().first()
-            events.append({"type": "ITEM_USE", "payload": {"actor_id": actor_id, "item_id": str(item_id), "effect": effect, "hp": int(row["hp"])}})
-
-    # Списание/удаление
-    max_ch = int(it.get("max_charges") or 0)
-    if max_ch > 0:
-        # многоразовый расходник
-        res = await consume_charge_db(session, item_id, 1)
-        if not res["ok"]:
-            return {"ok": False, "error": "empty"}
-        left = int(res.get("left") or 0)
-        events.append({"type": "CONSUME", "payload": {"item_id": str(item_id), "delta": -1, "left": left}})
-        if left <= 0:
-            await _delete_item_everywhere(session, item_id)
-    else:
-        # одноразовый
-        await _delete_item_everywhere(session, item_id)
-
-    await session.commit()
-    return {"ok": True, "events": events}
-
-
 async def spend_shot_if_needed(session: AsyncSession, weapon_item_id: str):
     """
     Хелпер для /intent ATTACK:
@@ -1851,12 +1655,10 @@ async def spend_shot_if_needed(session: AsyncSession, weapon_item_id: str):
 # ===================== COMBAT GEOMETRY (LoS, distance, accuracy) =====================
 from typing import Iterable
 
-def _chebyshev_distance(ax: int, ay: int, bx: int, by: int) -> int:
-    return max(abs(bx - ax), abs(by - ay))
-
-def _aligned(ax: int, ay: int, bx: int, by: int) -> bool:
+def _geom(ax: int, ay: int, bx: int, by: int) -> tuple[int, int, int, bool]:
+    """(dx, dy, dist, aligned): dist — Чебышёв, aligned — по прямой или диагонали."""
     dx, dy = abs(bx - ax), abs(by - ay)
-    return dx == 0 or dy == 0 or dx == dy  # по прямой или диагонали
+    return dx, dy, (dx if dx > dy else dy), (dx == 0) | (dy == 0) | (dx == dy)
 
 def _bresenham_line(ax: int, ay: int, bx: int, by: int) -> Iterable[tuple[int, int]]:
     """Клетки по линии между A и B, включая конечную, исключая стартовую."""
@@ -1882,86 +1684,78 @@ def _bresenham_line(ax: int, ay: int, bx: int, by: int) -> Iterable[tuple[int, i
             err += dx
             y += sy
 
-async def _cell_blocks_los(session: AsyncSession, node_id: str, x: int, y: int) -> bool:
-    """
-    Блокирует обзор объект, у которого в node_objects.props стоит:
-      {"block_los": true}
-    """
-    row = (
-        await session.execute(
-            text(
-                """
-                SELECT 1
-                FROM node_objects o
-                WHERE o.node_id = :nid AND o.x = :x AND o.y = :y
-                  AND (o.props ? 'block_los')
-                  AND (o.props->>'block_los')::boolean = true
-                LIMIT 1
-                """
-            ),
-            {"nid": node_id, "x": x, "y": y},
-        )
-    ).first()
-    return row is not None
+# Клетки узла с объектом {"block_los": true}. Набор меняется редко, а LoS
+# считается на каждую атаку/превью — читаем его один раз на транзакцию и
+# держим в session.info (сбрасывается на commit/rollback и при записи объектов).
+_PG_LOS_BLOCKERS = """
+    SELECT o.x, o.y
+      FROM node_objects o
+     WHERE o.node_id = $1
+       AND (o.props ? 'block_los')
+       AND (o.props->>'block_los')::boolean = true
+"""
+
+_LOS_CACHE_KEY = "los_blockers"
+
+
+async def _los_blockers(session: AsyncSession, node_id: str) -> frozenset:
+    cache = session.info.setdefault(_LOS_CACHE_KEY, {})
+    blockers = cache.get(node_id)
+    if blockers is None:
+        rows = await _pg_fetch(session, _PG_LOS_BLOCKERS, node_id)
+        blockers = cache[node_id] = frozenset((r["x"], r["y"]) for r in rows)
+    return blockers
+
+
+def _invalidate_los(session: AsyncSession, node_id: Optional[str] = None) -> None:
+    """Сбрасывает закэшированные блокеры LoS узла (или все) в этой сессии."""
+    cache = session.info.get(_LOS_CACHE_KEY)
+    if not cache:
+        return
+    if node_id is None:
+        cache.clear()
+    else:
+        cache.pop(node_id, None)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_los_on_tx_end(session) -> None:
+    session.info.pop(_LOS_CACHE_KEY, None)
 
 
 async def check_los(session: AsyncSession, node_id: str, ax: int, ay: int, bx: int, by: int) -> bool:
     """True, если между A и B нет клеток, блокирующих обзор."""
+    blockers = await _los_blockers(session, node_id)
     for cx, cy in _bresenham_line(ax, ay, bx, by):
         # конечную клетку (цель) тоже считаем видимой; блокируем только промежуточные
         if (cx, cy) == (bx, by):
             return True
-        if await _cell_blocks_los(session, node_id, cx, cy):
+        if (cx, cy) in blockers:
             return False
     return True
 
-async def _get_actor_pos(session: AsyncSession, actor_id: str):
-    row = (
-        await session.execute(
-            text("SELECT node_id, COALESCE(x,0) AS x, COALESCE(y,0) AS y FROM actors WHERE id=:id"),
-            {"id": actor_id},
-        )
-    ).mappings().first()
-    if not row or not row["node_id"]:
-        return None
-    return row["node_id"], int(row["x"]), int(row["y"])
-
-async def _weapon_in_hand(session: AsyncSession, actor_id: str):
-    """
-    Берём предмет из правой руки (если пусто — из левой). Возвращаем (item_id, kind_row).
-    kind_row включает нужные поля для дальности и точности.
-    """
-    inv = (
-        await session.execute(
-            text("""
-                SELECT left_item, right_item FROM inventories WHERE actor_id=:aid
-            """),
-            {"aid": actor_id},
-        )
-    ).mappings().first()
-    if not inv:
-        return None, None
-
-    hand_item = inv["right_item"] or inv["left_item"]
-    if not hand_item:
-        return None, None
-
-    kind = (
-        await session.execute(
-            text("""
-                SELECT k.id, k.title, k.weapon_class, k.damage_type,
-                       COALESCE(k.opt_range,1) AS opt_range,
-                       COALESCE(k.max_range,1) AS max_range,
-                       COALESCE(k.crit_chance,5.0) AS crit_chance,
-                       COALESCE(k.hit_bonus,0) AS hit_bonus
-                FROM items i
-                JOIN item_kinds k ON k.id = i.kind_id
-                WHERE i.id = :iid
-            """),
-            {"iid": hand_item},
-        )
-    ).mappings().first()
-    return hand_item, (dict(kind) if kind else None)
+# Всё для превью атаки одним запросом: позиции атакующего и цели (a_node /
+# t_node NULL — актёра нет или он вне узла) и оружие в руке атакующего
+# (правая, иначе левая). item_id без kind_id — в руке предмет без вида.
+_SQL_ATTACK_PREVIEW = text(
+    """
+    SELECT a.node_id AS a_node, COALESCE(a.x,0) AS ax, COALESCE(a.y,0) AS ay,
+           t.node_id AS t_node, COALESCE(t.x,0) AS tx, COALESCE(t.y,0) AS ty,
+           COALESCE(inv.right_item, inv.left_item) AS item_id,
+           k.id AS kind_id, k.title, k.weapon_class, k.damage_type,
+           COALESCE(k.opt_range,1) AS opt_range,
+           COALESCE(k.max_range,1) AS max_range,
+           COALESCE(k.crit_chance,5.0) AS crit_chance,
+           COALESCE(k.hit_bonus,0) AS hit_bonus
+      FROM (SELECT 1) one
+      LEFT JOIN actors a ON a.id = :aid
+      LEFT JOIN actors t ON t.id = :tid
+      LEFT JOIN inventories inv ON inv.actor_id = a.id
+      LEFT JOIN items i ON i.id = COALESCE(inv.right_item, inv.left_item)
+      LEFT JOIN item_kinds k ON k.id = i.kind_id
+    """
+)
 
 def _estimate_accuracy(dist: int, aligned: bool, opt_range: int, hit_bonus: int) -> int:
     """
@@ -1988,24 +1782,25 @@ async def preview_attack_geometry_db(session: AsyncSession, attacker_id: str, ta
       - projected accuracy
     Ошибки возвращает через {"ok": False, "error": "..."}.
     """
-    apos = await _get_actor_pos(session, attacker_id)
-    tpos = await _get_actor_pos(session, target_id)
-    if not apos:
+    row = (
+        await session.execute(_SQL_ATTACK_PREVIEW, {"aid": attacker_id, "tid": target_id})
+    ).mappings().first()
+    if not row["a_node"]:
         return {"ok": False, "error": "attacker_not_found_or_no_position"}
-    if not tpos:
+    if not row["t_node"]:
         return {"ok": False, "error": "target_not_found_or_no_position"}
 
-    node_a, ax, ay = apos
-    node_t, tx, ty = tpos
+    node_a, ax, ay = row["a_node"], int(row["ax"]), int(row["ay"])
+    node_t, tx, ty = row["t_node"], int(row["tx"]), int(row["ty"])
     if node_a != node_t:
         return {"ok": False, "error": "different_nodes"}
 
-    dist = _chebyshev_distance(ax, ay, tx, ty)
-    aligned = _aligned(ax, ay, tx, ty)
-    los = await check_los(session, node_a, ax, ay, tx, ty)
+    _, _, dist, aligned = _geom(ax, ay, tx, ty)
+    # соседняя клетка (или та же) — промежуточных клеток нет, обзор всегда есть
+    los = True if dist <= 1 else await check_los(session, node_a, ax, ay, tx, ty)
 
-    item_id, kind = await _weapon_in_hand(session, attacker_id)
-    if not kind:
+    # оружие в руке: kind_id NULL — руки пусты (или у предмета нет вида)
+    if not row["kind_id"]:
         return {
             "ok": True,
             "distance": dist,
@@ -2015,6 +1810,7 @@ async def preview_attack_geometry_db(session: AsyncSession, attacker_id: str, ta
             "projected_accuracy": None,
         }
 
+    item_id, kind = row["item_id"], row
     acc = _estimate_accuracy(dist, aligned, int(kind["opt_range"]), int(kind["hit_bonus"]))
 
     return {
@@ -2037,24 +1833,9 @@ async def preview_attack_geometry_db(session: AsyncSession, attacker_id: str, ta
 # ===================== COMBAT ATTACK (range/los/hit/crit/damage) =====================
 import random
 
-async def _get_resist_mod(session: AsyncSession, actor_id: str, damage_type: str) -> float:
-    row = (
-        await session.execute(
-            text("SELECT resistances FROM actors WHERE id=:id"),
-            {"id": actor_id},
-        )
-    ).mappings().first()
-    if not row:
-        return 1.0
-    res = row.get("resistances") or {}
-    try:
-        # jsonb может приехать как dict/str — нормализуем
-        if isinstance(res, str):
-            import json as _json
-            res = _json.loads(res)
-    except Exception:
-        res = {}
-    return float(res.get(damage_type, 1.0))
+# Свой генератор для бросков: random() без блокировок общего модуля и без
+# отбраковки randint; бросок d100 — int(_rand() * 100) + 1.
+_rand = random.Random().random
 
 async def _base_damage_for(kind: dict) -> int:
     """
@@ -2076,55 +1857,75 @@ async def _base_damage_for(kind: dict) -> int:
         return 7
     return 5  # melee по умолчанию
 
-async def _weapon_kind_for_item(session: AsyncSession, item_id: str) -> dict | None:
-    row = (
-        await session.execute(
-            text("""
-                SELECT k.id, k.title, k.weapon_class, k.damage_type, k.props,
-                       COALESCE(k.opt_range,1) AS opt_range,
-                       COALESCE(k.max_range,1) AS max_range,
-                       COALESCE(k.crit_chance,5.0) AS crit_chance,
-                       COALESCE(k.hit_bonus,0) AS hit_bonus
-                FROM items i
-                JOIN item_kinds k ON k.id = i.kind_id
-                WHERE i.id = :iid
-            """),
-            {"iid": item_id},
-        )
-    ).mappings().first()
-    return dict(row) if row else None
 
-async def _get_item_charges(session, item_id: str) -> int | None:
-    row = (await session.execute(
-        text("SELECT charges FROM items WHERE id=:iid"),
-        {"iid": item_id}
-    )).mappings().first()
-    if not row:
-        return None
-    return row["charges"]
+_SQL_SPEND_ONE_CHARGE = text(
+    """
+    UPDATE items
+       SET charges = CASE
+                       WHEN charges IS NULL THEN NULL
+                       WHEN charges > 0 THEN charges - 1
+                       ELSE charges
+                     END
+     WHERE id=:iid
+ RETURNING charges
+    """
+)
 
 
 async def _spend_one_charge(session, item_id: str) -> int | None:
-    row = (await session.execute(
-        text("""
-            UPDATE items
-               SET charges = CASE
-                               WHEN charges IS NULL THEN NULL
-                               WHEN charges > 0 THEN charges - 1
-                               ELSE charges
-                             END
-             WHERE id=:iid
-         RETURNING charges
-        """),
-        {"iid": item_id}
-    )).mappings().first()
+    row = (await session.execute(_SQL_SPEND_ONE_CHARGE, {"iid": item_id})).mappings().first()
     return row and row["charges"]
 
-    
+
+# Списать заряд compare-and-swap: UPDATE проходит только при charges > 0.
+# before — заряды до (NULL — у предмета нет счётчика), after — после списания
+# (NULL — списать не удалось).
+_SQL_TRY_SPEND_CHARGE = text(
+    """
+    WITH cur AS (
+        SELECT charges FROM items WHERE id = :iid
+    ),
+    upd AS (
+        UPDATE items SET charges = charges - 1
+         WHERE id = :iid AND charges > 0
+        RETURNING charges
+    )
+    SELECT (SELECT charges FROM cur) AS before,
+           (SELECT charges FROM upd) AS after
+    """
+)
+
+
+async def _try_spend_charge(session, item_id: str) -> tuple[str, int | None]:
+    """
+    Атомарно тратит 1 заряд. Возвращает:
+      ("spent", left)       — списали, left — остаток;
+      ("empty", 0)          — зарядов нет (в т.ч. кончились параллельно);
+      ("no_charges", None)  — у предмета нет счётчика.
+    """
+    row = (await session.execute(_SQL_TRY_SPEND_CHARGE, {"iid": item_id})).mappings().one()
+    if row["after"] is not None:
+        return "spent", row["after"]
+    if row["before"] is None:
+        return "no_charges", None
+    return "empty", 0
+
 
 # ---------- Боевая логика: реальная атака ----------
-from sqlalchemy import text
-import random
+
+_SQL_SET_HP_ZERO = text(
+    """
+    update actors
+       set stats = jsonb_set(
+            coalesce(stats, '{}'::jsonb),
+            '{hp}',
+            to_jsonb(0),
+            true
+       )
+     where id = :aid
+    """
+)
+
 
 async def handle_actor_death(session: AsyncSession, actor_id: str) -> None:
     """
@@ -2133,34 +1934,20 @@ async def handle_actor_death(session: AsyncSession, actor_id: str) -> None:
     - гарантированно ставит hp = 0 в stats.
     Дальше можно расширить: телепорт героя, дроп лута, отметка "труп" и т.п.
     """
-    await session.execute(
-        text(
-            """
-            update actors
-               set stats = jsonb_set(
-                    coalesce(stats, '{}'::jsonb),
-                    '{hp}',
-                    to_jsonb(0),
-                    true
-               )
-             where id = :aid
-            """
-        ),
-        {"aid": actor_id},
-    )
+    await session.execute(_SQL_SET_HP_ZERO, {"aid": actor_id})
 
 # ----------------- ammo helpers -----------------
-async def _weapon_ammo_type_for_item(session, item_id: str) -> str | None:
-    row = (await session.execute(
-        text("""
-            SELECT k.ammo_type
-            FROM items i
-            JOIN item_kinds k ON k.id = i.kind_id
-            WHERE i.id = :iid
-        """),
-        {"iid": item_id}
-    )).mappings().first()
-    return row and row["ammo_type"]
+_SQL_FIND_AMMO = text(
+    """
+    SELECT i.id, k.title, i.charges
+    FROM inventories inv
+    JOIN items i ON i.id = ANY(inv.backpack)
+    JOIN item_kinds k ON k.id = i.kind_id
+    WHERE inv.actor_id = :aid
+      AND COALESCE(k.ammo_type, '') = :ammo
+    LIMIT 1
+    """
+)
 
 
 async def _find_ammo_in_backpack(session, actor_id: str, ammo_type: str):
@@ -2170,21 +1957,42 @@ async def _find_ammo_in_backpack(session, actor_id: str, ammo_type: str):
     - items.id = any(backpack) and item_kinds.ammo_type = :ammo_type
     Возвращаем dict(id, title, charges) или None.
     """
-    row = (await session.execute(
-        text("""
-            SELECT i.id, k.title, i.charges
-            FROM inventories inv
-            JOIN items i ON i.id = ANY(COALESCE(inv.backpack,'{}'::uuid[]))
-            JOIN item_kinds k ON k.id = i.kind_id
-            WHERE inv.actor_id = :aid
-              AND COALESCE(k.ammo_type, '') = :ammo
-            LIMIT 1
-        """),
-        {"aid": actor_id, "ammo": ammo_type}
-    )).mappings().first()
+    row = (await session.execute(_SQL_FIND_AMMO, {"aid": actor_id, "ammo": ammo_type})).mappings().first()
     return dict(row) if row else None
 
 
+# Списать 1 патрон из пачки одним запросом: при charges > 1 — минус один,
+# иначе (1 или NULL) пачка удаляется и убирается из рюкзака актёра.
+# found = false — пачки нет.
+_SQL_CONSUME_ONE_AMMO = text(
+    """
+    WITH cur AS (
+        SELECT id, charges FROM items WHERE id = CAST(:iid AS uuid)
+    ),
+    del AS (
+        DELETE FROM items t
+         USING cur
+         WHERE t.id = cur.id AND (cur.charges IS NULL OR cur.charges <= 1)
+        RETURNING t.id
+    ),
+    inv AS (
+        UPDATE inventories
+           SET backpack = array_remove(backpack, CAST(:iid AS uuid))
+         WHERE actor_id = :aid AND EXISTS (SELECT 1 FROM del)
+    ),
+    dec AS (
+        UPDATE items t SET charges = t.charges - 1
+          FROM cur
+         WHERE t.id = cur.id AND cur.charges > 1
+        RETURNING t.charges
+    )
+    SELECT EXISTS (SELECT 1 FROM cur) AS found,
+           EXISTS (SELECT 1 FROM del) AS deleted,
+           (SELECT charges FROM dec) AS after
+    """
+)
+
+
 async def _consume_one_ammo_from_backpack(session, actor_id: str, ammo_item_id: str):
     """
     Тратим 1 заряд из ammo-предмета:
@@ -2192,50 +2000,18 @@ async def _consume_one_ammo_from_backpack(session, actor_id: str, ammo_item_id:
     - если charges <= 1 или NULL: удалить предмет и убрать из inventories.backpack
     Возвращаем {"left": int|None, "deleted": bool}
     """
-    # current charges
-    r = (await session.execute(
-        text("SELECT charges FROM items WHERE id=:iid"),
-        {"iid": ammo_item_id}
-    )).mappings().first()
-    if not r:
+    row = (
+        await session.execute(_SQL_CONSUME_ONE_AMMO, {"aid": actor_id, "iid": ammo_item_id})
+    ).mappings().one()
+    if not row["found"]:
         return {"left": None, "deleted": True}
-
-    ch = r["charges"]
-    if ch is None or ch <= 1:
-        # удаляем сам предмет
-        await session.execute(text("DELETE FROM items WHERE id=:iid"), {"iid": ammo_item_id})
-        # и убираем из backpack
-        await session.execute(
-            text("""
-                UPDATE inventories
-                   SET backpack = array_remove(COALESCE(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
-                 WHERE actor_id = :aid
-            """),
-            {"aid": actor_id, "iid": ammo_item_id}
-        )
+    if row["deleted"]:
         return {"left": 0, "deleted": True}
+    return {"left": row["after"], "deleted": False}
 
-    # иначе просто минус 1
-    row2 = (await session.execute(
-        text("""
-            UPDATE items SET charges = charges - 1
-             WHERE id=:iid
-         RETURNING charges
-        """),
-        {"iid": ammo_item_id}
-    )).mappings().first()
-    return {"left": row2 and row2["charges"], "deleted": False}
-
-async def _actor_stat_from_meta(session, actor_id: str, key: str, default: int = 0) -> int:
-    row = (await session.execute(
-        text("SELECT meta FROM actors WHERE id=:aid"),
-        {"aid": actor_id}
-    )).mappings().first()
-    if not row:
-        return default
-    meta = row["meta"] or {}
+def _meta_int(v, default: int = 0) -> int:
+    """Числовой стат из actors.meta (значение уже вынуто в SQL: meta->'key')."""
     try:
-        v = meta.get(key, default)
         return int(v) if v is not None else default
     except Exception:
         return default
@@ -2243,6 +2019,51 @@ async def _actor_stat_from_meta(session, actor_id: str, key: str, default: int =
 
 
 
+# Урон по stats.hp (JSONB) с полом 0; новое hp — из RETURNING.
+_SQL_DAMAGE_HP = text(
+    """
+    update actors
+       set stats = jsonb_set(
+            coalesce(stats,'{}'::jsonb),
+            '{hp}',
+            to_jsonb( GREATEST(0, (coalesce((stats->>'hp')::int, 0)) - CAST(:dmg AS int)) ),
+            true
+       )
+     where id = :tid
+    returning coalesce((stats->>'hp')::int, 0) as hp
+    """
+)
+
+
+# Всё для атаки одним чтением: атакующий, оружие в правой руке (заряды, урон
+# и crit_mult из props вида), цель (tid NULL — цели нет), её модификатор
+# сопротивления к типу урона оружия и статы из meta для точности.
+# Нет строки — нет атакующего.
+_SQL_ATTACK_CONTEXT = text(
+    """
+    SELECT a.id AS aid, a.node_id, a.x, a.y,
+           i.id AS item_id, i.charges AS item_charges,
+           k.title AS weapon_title, k.weapon_class, k.damage_type,
+           k.opt_range, k.max_range, k.crit_chance, k.hit_bonus,
+           k.ammo_type,
+           (lower(COALESCE(k.ammo_type, '')) = 'arrow'
+            OR EXISTS (SELECT 1 FROM unnest(k.tags) tg WHERE lower(tg) = 'bow')) AS is_bow,
+           (k.props->>'damage')::int AS base_damage,
+           CASE WHEN jsonb_typeof(k.props->'crit_mult') = 'number'
+                THEN (k.props->>'crit_mult')::float ELSE 2.0 END AS crit_mult,
+           t.id AS tid, t.x AS tx, t.y AS ty,
+           COALESCE((t.resistances->>COALESCE(k.damage_type, 'physical'))::float, 1.0) AS resist_mod,
+           a.meta->'acc_bonus' AS acc_bonus, t.meta->'evasion' AS tgt_evasion
+      FROM actors a
+      LEFT JOIN inventories inv ON inv.actor_id = a.id
+      LEFT JOIN items i         ON i.id = inv.right_item
+      LEFT JOIN item_kinds k    ON k.id = i.kind_id
+      LEFT JOIN actors t        ON t.id = :tid
+     WHERE a.id = :aid
+    """
+)
+
+
 async def perform_attack_db(session, attacker_id: str, target_id: str):
     """
     Выполняет фактическую атаку (старая логика) + статусы/броня:
@@ -2253,26 +2074,12 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
       - броня цели (-10% за уровень 0..5) (+временный бонус от guard)
       - статусные модификаторы: slow/guard/rage (простые и прозрачные)
     """
-    import random
-    from sqlalchemy import text
-
     events = []
 
-    # --- атакующий + оружие (правая рука) ---
-    q = await session.execute(text("""
-        SELECT a.id AS aid, a.node_id, a.x, a.y,
-               i.id AS item_id,
-               k.title AS weapon_title, k.weapon_class, k.damage_type,
-               k.opt_range, k.max_range, k.crit_chance, k.hit_bonus,
-               k.ammo_type, k.tags,
-               (k.props->>'damage')::int AS base_damage
-        FROM actors a
-        LEFT JOIN inventories inv ON inv.actor_id = a.id
-        LEFT JOIN items i         ON i.id = inv.right_item
-        LEFT JOIN item_kinds k    ON k.id = i.kind_id
-        WHERE a.id = :aid
-    """), {"aid": attacker_id})
-    atk = q.mappings().first()
+    # --- атакующий + оружие (правая рука) + цель — одним запросом ---
+    atk = (
+        await session.execute(_SQL_ATTACK_CONTEXT, {"aid": attacker_id, "tid": target_id})
+    ).mappings().first()
     if not atk or not atk["item_id"]:
         return {"ok": True, "events": [{"type": "NO_WEAPON", "payload": {}}]}
 
@@ -2280,22 +2087,16 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
     item_id = weapon["item_id"]
 
     # --- цель ---
-    tq = await session.execute(
-        text("SELECT id, node_id, x, y, resistances FROM actors WHERE id=:tid"),
-        {"tid": target_id}
-    )
-    tgt = tq.mappings().first()
-    if not tgt:
+    if not atk["tid"]:
         return {"ok": False, "error": "target_not_found"}
+    tgt = {"x": atk["tx"], "y": atk["ty"]}
 
     # --- геометрия ---
-    dx = abs(atk["x"] - tgt["x"])
-    dy = abs(atk["y"] - tgt["y"])
-    dist = max(dx, dy)
-    aligned = (dx == 0 or dy == 0 or dx == dy)
+    dx, dy, dist, aligned = _geom(atk["x"], atk["y"], tgt["x"], tgt["y"])
 
     # --- линия обзора ---
-    los = await check_los(session, atk["node_id"], atk["x"], atk["y"], tgt["x"], tgt["y"])
+    # соседняя клетка — промежуточных клеток нет, блокеры узла не читаем
+    los = True if dist <= 1 else await check_los(session, atk["node_id"], atk["x"], atk["y"], tgt["x"], tgt["y"])
     if not los:
         return {"ok": True, "events": [
             {"type": "ATTACK_START", "payload": {
@@ -2331,10 +2132,11 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
 
     # --- боезапас/заряды ---
     spent_ev = empty_ev = hint_ev = None
-    cur_ch = await _get_item_charges(session, item_id)
+    cur_ch = weapon["item_charges"]
     if cur_ch is not None:
-        if (cur_ch or 0) <= 0:
-            await session.rollback()
+        # пусто уже по прочитанному — не пишем; иначе списываем атомарно
+        status, left = ("empty", 0) if cur_ch <= 0 else await _try_spend_charge(session, item_id)
+        if status == "empty":
             return {"ok": True, "events": [
                 {"type": "ATTACK_START", "payload": {
                     "attacker": attacker_id, "target": target_id,
@@ -2343,17 +2145,16 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
                 }},
                 {"type": "NO_AMMO", "payload": {}}
             ]}
-        left = await _spend_one_charge(session, item_id)
-        spent_ev = {"type": "CONSUME", "payload": {"item": weapon["weapon_title"], "delta": -1, "left": left}}
-        if left == 0:
-            empty_ev = {"type": "AMMO_EMPTY", "payload": {}}
-            hint_ev  = {"type": "RELOAD_HINT", "payload": {"endpoint": "/inventory/reload"}}
+        if status == "spent":
+            spent_ev = {"type": "CONSUME", "payload": {"item": weapon["weapon_title"], "delta": -1, "left": left}}
+            if left == 0:
+                empty_ev = {"type": "AMMO_EMPTY", "payload": {}}
+                hint_ev  = {"type": "RELOAD_HINT", "payload": {"endpoint": "/inventory/reload"}}
     else:
-        weapon_ammo = await _weapon_ammo_type_for_item(session, item_id)
+        weapon_ammo = weapon["ammo_type"]
         if weapon_ammo:
             ammo = await _find_ammo_in_backpack(session, attacker_id, weapon_ammo)
             if not ammo:
-                await session.rollback()
                 return {"ok": True, "events": [
                     {"type": "ATTACK_START", "payload": {
                         "attacker": attacker_id, "target": target_id,
@@ -2399,8 +2200,7 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
         accuracy += int(weapon["hit_bonus"])
 
     # штраф для луков в упоре
-    tags = weapon.get("tags") or []
-    is_bow = (str(weapon.get("ammo_type") or "").lower() == "arrow") or ("bow" in [t.lower() for t in (tags or [])])
+    is_bow = bool(weapon["is_bow"])
     min_r = int(weapon.get("min_range") or 0)
     if is_bow and min_r > 0 and (weapon.get("weapon_class") or "").lower() == "ranged" and dist < min_r:
         close_pen = (min_r - dist) * int(weapon.get("near_penalty") or 10)
@@ -2409,8 +2209,8 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
             accuracy -= close_pen
 
     # из meta
-    atk_acc = await _actor_stat_from_meta(session, attacker_id, "acc_bonus", 0)
-    tgt_eva = await _actor_stat_from_meta(session, target_id,   "evasion",   0)
+    atk_acc = _meta_int(atk["acc_bonus"])
+    tgt_eva = _meta_int(atk["tgt_evasion"])
     if atk_acc:
         mods["acc_bonus"] = int(atk_acc); accuracy += int(atk_acc)
     if tgt_eva:
@@ -2424,7 +2224,7 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
         accuracy += acc_delta
 
     accuracy = max(5, min(95, accuracy))
-    roll = random.randint(1, 100)
+    roll = int(_rand() * 100) + 1
     events.append({"type": "HIT_ROLL", "payload": {"accuracy": accuracy, "roll": roll, "mods": mods}})
     if roll > accuracy:
         events.append({"type": "ATTACK_MISS", "payload": {}})
@@ -2434,20 +2234,7 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
     # --- базовый урон + крит ---
     base = (weapon["base_damage"] or 5) + int(smods.get("damage_bonus_attacker", 0))
     base = int(round(base * float(smods.get("damage_mult_attacker", 1.0))))
-    crit_mult = 2.0
-    try:
-        row_props = (await session.execute(
-            text("SELECT k.props FROM item_kinds k JOIN items i ON i.kind_id = k.id WHERE i.id = :iid"),
-            {"iid": item_id}
-        )).mappings().first()
-        if row_props:
-            props = row_props.get("props") or {}
-            if isinstance(props, dict):
-                cm = props.get("crit_mult")
-                if cm is not None:
-                    crit_mult = float(cm)
-    except Exception:
-        pass
+    crit_mult = float(weapon["crit_mult"])
 
     crit = roll <= (weapon["crit_chance"] or 0)
     if crit:
@@ -2459,11 +2246,7 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
 
     # --- сопротивление цели ---
     dmg_type = weapon["damage_type"] or "physical"
-    resist_mod = 1.0
-    if tgt["resistances"]:
-        mod = tgt["resistances"].get(dmg_type)
-        if mod is not None:
-            resist_mod = float(mod)
+    resist_mod = float(atk["resist_mod"])
     events.append({"type": "RESIST_APPLY", "payload": {"damage_type": dmg_type, "resist_mod": resist_mod}})
 
     # --- броня цели (0..5 уровней) + бонус от guard ---
@@ -2479,24 +2262,12 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
         events.append({"type": "ARMOR_APPLY", "payload": {"level": armor_lvl, "before": final_dmg, "after": armored}})
     final_dmg = armored
 
-    # --- применяем урон: stats.hp (JSONB) ---
-    await session.execute(text("""
-        update actors
-           set stats = jsonb_set(
-                coalesce(stats,'{}'::jsonb),
-                '{hp}',
-                to_jsonb( GREATEST(0, (coalesce((stats->>'hp')::int, 0)) - CAST(:dmg AS int)) ),
-                true
-           )
-         where id = :tid
-    """), {"tid": target_id, "dmg": int(final_dmg)})
+    # --- применяем урон: stats.hp (JSONB), новое hp — сразу из RETURNING ---
+    nhp = (await session.execute(_SQL_DAMAGE_HP, {"tid": target_id, "dmg": int(final_dmg)})).scalar_one()
 
     events.append({"type": "DAMAGE_APPLY", "payload": {"final": final_dmg}})
 
     # --- смерть цели ---
-    nhp = (await session.execute(text("""
-        select coalesce((stats->>'hp')::int, 0) as hp from actors where id=:tid
-    """), {"tid": target_id})).mappings().first()["hp"]
     if nhp <= 0:
         events.append({"type": "DEATH", "payload": {"target": target_id}})
 
@@ -2505,6 +2276,13 @@ async def perform_attack_db(session, attacker_id: str, target_id: str):
 
 # --- REACTIVE COUNTER HELPERS ---
 
+_SQL_INSERT_TMP_STATUS = text(
+    """
+    insert into actor_statuses(actor_id, session_id, label, note, tags, turns_left, intensity, meta)
+    values(:aid, null, :lbl, :note, :tags, :ttl, 1, :meta)
+    """
+)
+
 async def _apply_tmp_status(
     session: AsyncSession,
     actor_id: str,
@@ -2516,10 +2294,7 @@ async def _apply_tmp_status(
 ) -> None:
     """Запишем 1-ходовой статус в actor_statuses (session_id допускается NULL)."""
     await session.execute(
-        text("""
-            insert into actor_statuses(actor_id, session_id, label, note, tags, turns_left, intensity, meta)
-            values(:aid, null, :lbl, :note, :tags, :ttl, 1, :meta)
-        """),
+        _SQL_INSERT_TMP_STATUS,
         {
             "aid": actor_id,
             "lbl": label,
@@ -2543,8 +2318,6 @@ async def npc_reactive_counter_db(
       - сильный (>=12)          -> по умолчанию stagger (-15 acc), но 20% шанс rage (+10 acc, +30% dmg)
     Затем запускаем обычную атаку perform_attack_db(npc -> hero).
     """
-    import random
-
     received_damage = max(0, int(received_damage))
 
     applied = []
@@ -2557,7 +2330,7 @@ async def npc_reactive_counter_db(
         pass
     else:
         # сильный урон → обычно шатание, но редко ярость
-        if random.random() < 0.20:
+        if _rand() < 0.20:
             await _apply_tmp_status(session, npc_id, "rage", 1, {"accuracy_mod_attacker": 10, "damage_mult_attacker": 1.3})
             applied.append({"label": "rage", "mods": {"+acc": 10, "x dmg": 1.3}})
         else:
@@ -10,7 +10,7 @@ from typing import List, Literal, Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
 load_dotenv()  # подхватываем .env ДО импортов app.*
 
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Response
 from pydantic import BaseModel
 
 from sqlalchemy import text, bindparam
@@ -26,7 +26,7 @@ import random  # для вероятности наложения статуса
 
 from app.db import get_session
 from app.dao import (
-    fetch_node,
+    fetch_node_json,
     fetch_inventory,
     learn_skill,
     actor_knows_skill,  # может использоваться дальше; оставим
@@ -424,10 +424,11 @@ async def debug_llm_npc_ping():
 # ────────────────────────────────────────────────────────────────────────────────
 @app.get("/node/{node_id}")
 async def get_node(node_id: str, session: AsyncSession = Depends(get_session)):
-    node = await fetch_node(session, node_id)
-    if not node:
+    # узел уже сериализован (и закэширован) в DAO — отдаём байты как есть
+    node_json = await fetch_node_json(session, node_id)
+    if node_json is None:
         raise HTTPException(status_code=404, detail="Node not found")
-    return node
+    return Response(content=node_json, media_type="application/json")
 
 @app.get("/inventory/{actor_id}")
 async def get_inventory(actor_id: str, session: AsyncSession = Depends(get_session)):
@@ -451,6 +452,7 @@ class ActorOnlyIn(BaseModel):
 @app.post("/inventory/equip_backpack")
 async def equip_backpack(body: EquipBackpackIn, session: AsyncSession = Depends(get_session)):
     res = await equip_backpack_db(session, body.actor_id, body.item_id)
+    await session.commit()
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
     return res
@@ -458,6 +460,7 @@ async def equip_backpack(body: EquipBackpackIn, session: AsyncSession = Depends(
 @app.post("/inventory/unequip_backpack")
 async def unequip_backpack(body: ActorOnlyIn, session: AsyncSession = Depends(get_session)):
     res = await unequip_backpack_db(session, body.actor_id)
+    await session.commit()
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
     return res
@@ -465,6 +468,7 @@ async def unequip_backpack(body: ActorOnlyIn, session: AsyncSession = Depends(ge
 @app.post("/inventory/hold_bag")
 async def hold_bag(body: HoldBagIn, session: AsyncSession = Depends(get_session)):
     res = await hold_bag_db(session, body.actor_id, body.item_id, body.hand)
+    await session.commit()
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
     return res
@@ -1062,7 +1066,7 @@ async def unlock_container(body: UnlockContainerIn, session: AsyncSession = Depe
     has_key = (await session.execute(text("""
         select 1
           from inventories inv
-          join items i on i.id = any(coalesce(inv.backpack, '{}'::uuid[]))
+          join items i on i.id = any(inv.backpack)
          where inv.actor_id = :aid
            and i.kind_id = :kkid
          limit 1
@@ -1101,7 +1105,7 @@ async def pickup_from_container(body: PickupFromContainerIn, session: AsyncSessi
 
     bp = (await session.execute(text("""
         update inventories
-           set backpack = array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
+           set backpack = array_append(backpack, CAST(:iid AS uuid))
          where actor_id = :aid
         returning backpack
     """), {"iid": body.item_id, "aid": body.actor_id})).mappings().first()
@@ -1126,9 +1130,9 @@ async def drop_to_container(body: DropToContainerIn, session: AsyncSession = Dep
 
     removed = (await session.execute(text("""
         update inventories
-           set backpack = array_remove(coalesce(backpack,'{}'::uuid[]), CAST(:iid AS uuid))
+           set backpack = array_remove(backpack, CAST(:iid AS uuid))
          where actor_id = :aid
-           and CAST(:iid AS uuid) = any(coalesce(backpack,'{}'::uuid[]))
+           and CAST(:iid AS uuid) = any(backpack)
         returning backpack
     """), {"iid": body.item_id, "aid": body.actor_id})).mappings().first()
     if not removed:
@@ -1180,6 +1184,7 @@ async def grid_put(body: GridPutIn, session: AsyncSession = Depends(get_session)
     res = await grid_put_item_db(session, body.actor_id, body.container_item_id, body.slot_x, body.slot_y, body.source_place, body.item_id)
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
+    await session.commit()
     return res
 
 @app.post("/inventory/grid/take")
@@ -1187,6 +1192,7 @@ async def grid_take(body: GridTakeIn, session: AsyncSession = Depends(get_sessio
     res = await grid_take_item_db(session, body.actor_id, body.container_item_id, body.slot_x, body.slot_y, body.target_place)
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
+    await session.commit()
     return res
 
 class DropIn(BaseModel):
@@ -1199,6 +1205,7 @@ async def inventory_drop(body: DropIn, session: AsyncSession = Depends(get_sessi
     res = await drop_to_ground_db(session, body.actor_id, body.source, body.item_id)
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
+    await session.commit()
     return res
 
 @app.post("/inventory/drop_hidden")
@@ -1206,6 +1213,7 @@ async def inventory_drop_hidden(body: ActorOnlyIn, session: AsyncSession = Depen
     res = await drop_hidden_to_ground_db(session, body.actor_id)
     if not res.get("ok"):
         raise HTTPException(status_code=400, detail=res.get("error", "fail"))
+    await session.commit()
     return res
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -1483,8 +1491,8 @@ async def debug_seed_mini(body: SeedMiniIn, session: AsyncSession = Depends(get_
         await session.execute(text("""
             update inventories
                set backpack = case
-                   when not (CAST(:iid as uuid) = any(coalesce(backpack,'{}'::uuid[])))
-                   then array_append(coalesce(backpack,'{}'::uuid[]), CAST(:iid as uuid))
+                   when not (CAST(:iid as uuid) = any(backpack))
+                   then array_append(backpack, CAST(:iid as uuid))
                    else backpack end
              where actor_id=:aid
         """), {"aid": aid, "iid": iid})
@@ -398,7 +398,7 @@ async def take_from_container(
     # кладём игроку в рюкзак
     await session.execute(text("""
         update inventories
-        set backpack = coalesce(backpack,'{}'::uuid[]) || :iid
+        set backpack = backpack || :iid
         where actor_id='player'
     """), {"iid": body.item_id})
 
@@ -423,7 +423,7 @@ async def put_to_container(
 
     # предмет у игрока?
     in_player = (await session.execute(text("""
-        select :iid = any(coalesce(backpack,'{}'::uuid[])) as ok
+        select :iid = any(backpack) as ok
         from inventories where actor_id='player'
     """), {"iid": body.item_id})).scalar()
     if not in_player:
@@ -441,7 +441,7 @@ async def put_to_container(
     # убираем у игрока
     await session.execute(text("""
         update inventories
-        set backpack = array_remove(coalesce(backpack,'{}'::uuid[]), :iid)
+        set backpack = array_remove(backpack, :iid)
         where actor_id='player'
     """), {"iid": body.item_id})
 
@@ -490,7 +490,7 @@ async def pickup_object(
     # кладём в рюкзак игрока
     await session.execute(text("""
         update inventories
-        set backpack = coalesce(backpack,'{}'::uuid[]) || :iid
+        set backpack = backpack || :iid
         where actor_id='player'
     """), {"iid": iid})
 
@@ -56,6 +56,7 @@ async def reload_weapon(req: ReloadRequest, session: AsyncSession = Depends(get_
         return {"ok": False, "error": "no_weapon_in_hand"}
 
     res = await reload_weapon_db(session, req.actor_id, item["id"])
+    await session.commit()
     return res
 
 
@@ -67,6 +68,7 @@ async def api_equip_item(actor_id: str, hand: str, item_id: str, session: AsyncS
     Взять предмет в руку (left/right).
     """
     result = await equip_item_db(session, actor_id, hand, item_id)
+    await session.commit()
     return {"ok": True, "events": result}
 
 
@@ -76,6 +78,7 @@ async def api_unequip_item(actor_id: str, hand: str, session: AsyncSession = Dep
     Убрать предмет из руки в рюкзак.
     """
     result = await unequip_item_db(session, actor_id, hand)
+    await session.commit()
     return {"ok": True, "events": result}
 
 
@@ -87,6 +90,7 @@ async def api_hold_bag(actor_id: str, hand: str, item_id: str, session: AsyncSes
     Взять мешок (контейнер) в руку.
     """
     result = await hold_bag_db(session, actor_id, item_id, hand)
+    await session.commit()
     return result
 
 
@@ -96,6 +100,7 @@ async def api_equip_backpack(actor_id: str, item_id: str, session: AsyncSession
     Надеть рюкзак (контейнер) на спину.
     """
     result = await equip_backpack_db(session, actor_id, item_id)
+    await session.commit()
     return result
 
 
@@ -105,4 +110,5 @@ async def api_unequip_backpack(actor_id: str, session: AsyncSession = Depends(ge
     Снять рюкзак.
     """
     result = await unequip_backpack_db(session, actor_id)
+    await session.commit()
     return result
@@ -24,4 +24,5 @@ async def use_item(req: UseRequest, session: AsyncSession = Depends(get_session)
       - При 0 charges — предмет удаляется.
     """
     res = await use_consumable_db(session, req.actor_id, req.item_id)
+    await session.commit()
     return {"ok": True, "events": res}
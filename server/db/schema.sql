@@ -10,7 +10,7 @@ CREATE TABLE IF NOT EXISTS nodes (
   size_w     INT  NOT NULL,
   size_h     INT  NOT NULL,
   layout     JSONB DEFAULT '{}'::jsonb,
-  exits      JSONB DEFAULT '[]'::jsonb,
+  exits      JSONB NOT NULL DEFAULT '{}'::jsonb,
   created_at timestamptz DEFAULT now()
 );
 
@@ -84,7 +84,7 @@ CREATE TABLE IF NOT EXISTS facts (
 INSERT INTO nodes (id, title, biome, size_w, size_h, exits)
 VALUES (
   'castle_hall','Зал замка','castle',16,16,
-  '[{"id":"to_courtyard","x":0,"y":8,"to":"castle_courtyard"}]'
+  '{"west":"castle_courtyard"}'
 )
 ON CONFLICT (id) DO NOTHING;
 
@@ -243,3 +243,129 @@ VALUES
   ('cloth_sack', 'Мешок', 'Мешок 2×2, занимает одну руку', ARRAY['container'], 'one_hand', 0, 0,
    '{"container":true,"ui":"sack"}', 2, 2, 1)
 ON CONFLICT (id) DO NOTHING;
+
+-- === Индексы под чтение узла (fetch_node) =======================
+-- Подзапросы fetch_node всегда фильтруют по node_id и читают фиксированный
+-- набор колонок — покрывающие индексы дают index-only scan без похода в heap
+-- (пока autovacuum держит visibility map свежей).
+-- aggression читается в fetch_node и сидерах, но в CREATE TABLE выше её нет.
+ALTER TABLE actors ADD COLUMN IF NOT EXISTS aggression INT DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_actors_node_covering
+  ON actors(node_id) INCLUDE (id, kind, archtype, x, y, hp, mood, trust, aggression);
+
+CREATE INDEX IF NOT EXISTS idx_facts_node_covering
+  ON facts(node_id) INCLUDE (k, v);
+
+-- objects в fetch_node читаются по node_id в порядке (y, x, layer, id) —
+-- ключ индекса совпадает с ORDER BY, сортировка не нужна.
+-- node_objects создаётся вне этой схемы, поэтому индекс — только если таблица есть.
+DO $$
+BEGIN
+  IF to_regclass('public.node_objects') IS NOT NULL THEN
+    CREATE INDEX IF NOT EXISTS idx_node_objects_node_covering
+      ON node_objects(node_id, y, x, layer, id) INCLUDE (asset_id, rotation, props);
+  END IF;
+END$$;
+
+-- === Индексы под чтение инвентаря (fetch_inventory) =============
+-- Грид контейнера читается по container_item_id в порядке (y, x) вместе с item_id:
+-- index-only scan вместо похода в heap. PK (container_item_id, slot_x, slot_y)
+-- item_id не покрывает. Остальные чтения инвентаря идут по PK
+-- (inventories.actor_id, items.id, item_kinds.id) — отдельные индексы не нужны.
+CREATE INDEX IF NOT EXISTS idx_carried_slots_grid_covering
+  ON carried_container_slots(container_item_id, slot_y, slot_x) INCLUDE (item_id);
+
+-- === nodes.exits: всегда jsonb-объект {направление: node_id} ======
+-- Старые строки хранят exits как NULL, массив [{id,x,y,to}] или json-строку
+-- с объектом/массивом внутри — приводим к объекту один раз здесь, чтобы
+-- чтение узла не нормализовало exits на каждом запросе.
+-- Ключи — north/south/east/west (их понимает _ensure_reverse_exit): берём
+-- direction/dir выхода, иначе край карты по x/y (y = 0 — север). Выходы
+-- без направления (угол, середина карты) или без "to" отбрасываются с
+-- NOTICE; битая json-строка сбрасывается в '{}' тоже с NOTICE.
+DO $$
+DECLARE
+  r   record;
+  e   jsonb;
+  v   jsonb;
+  d   text;
+  ex  int;
+  ey  int;
+  res jsonb;
+BEGIN
+  FOR r IN SELECT id, exits FROM nodes WHERE jsonb_typeof(exits) = 'string' LOOP
+    BEGIN
+      v := (r.exits #>> '{}')::jsonb;
+    EXCEPTION WHEN invalid_text_representation THEN
+      RAISE NOTICE 'nodes.exits %: не JSON, сброшено в {}', r.id;
+      v := '{}'::jsonb;
+    END;
+    UPDATE nodes SET exits = v WHERE id = r.id;
+  END LOOP;
+
+  FOR r IN SELECT id, exits, size_w, size_h FROM nodes WHERE jsonb_typeof(exits) = 'array' LOOP
+    res := '{}'::jsonb;
+    FOR e IN SELECT a.v FROM jsonb_array_elements(r.exits) AS a(v) LOOP
+      d := NULL;
+      IF jsonb_typeof(e) = 'object' THEN
+        d := lower(coalesce(e ->> 'direction', e ->> 'dir'));
+        IF d IS NULL AND (e ->> 'x') ~ '^\d+$' AND (e ->> 'y') ~ '^\d+$' THEN
+          ex := (e ->> 'x')::int;
+          ey := (e ->> 'y')::int;
+          d := CASE
+                 WHEN ex = 0              AND ey NOT IN (0, r.size_h - 1) THEN 'west'
+                 WHEN ex = r.size_w - 1   AND ey NOT IN (0, r.size_h - 1) THEN 'east'
+                 WHEN ey = 0              AND ex NOT IN (0, r.size_w - 1) THEN 'north'
+                 WHEN ey = r.size_h - 1   AND ex NOT IN (0, r.size_w - 1) THEN 'south'
+               END;
+        END IF;
+      END IF;
+      IF d IN ('north', 'south', 'east', 'west') AND e ->> 'to' IS NOT NULL AND NOT res ? d THEN
+        res := res || jsonb_build_object(d, e ->> 'to');
+      ELSE
+        RAISE NOTICE 'nodes.exits %: выход % отброшен (нет направления)', r.id, e;
+      END IF;
+    END LOOP;
+    UPDATE nodes SET exits = res WHERE id = r.id;
+  END LOOP;
+END$$;
+
+UPDATE nodes
+   SET exits = '{}'::jsonb
+ WHERE exits IS NULL OR jsonb_typeof(exits) <> 'object';
+
+ALTER TABLE nodes
+  ALTER COLUMN exits SET DEFAULT '{}'::jsonb,
+  ALTER COLUMN exits SET NOT NULL;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+    WHERE conname = 'nodes_exits_object_ck'
+  ) THEN
+    ALTER TABLE nodes
+      ADD CONSTRAINT nodes_exits_object_ck
+      CHECK (jsonb_typeof(exits) = 'object');
+  END IF;
+END$$;
+
+-- === inventories.backpack: никогда не NULL ========================
+-- Запросы инвентаря работают с backpack напрямую (array_append/array_remove,
+-- = ANY(backpack)) без COALESCE(backpack, '{}') — пустой рюкзак это '{}'.
+UPDATE inventories
+   SET backpack = '{}'::uuid[]
+ WHERE backpack IS NULL;
+
+ALTER TABLE inventories
+  ALTER COLUMN backpack SET DEFAULT '{}'::uuid[],
+  ALTER COLUMN backpack SET NOT NULL;
+
+-- Экземпляры по виду (FK items.kind_id → item_kinds: проверка ON DELETE
+-- RESTRICT и выборки «все предметы вида») — без индекса это seq scan items.
+-- Точечные чтения идут по PK: inventories(actor_id), items(id),
+-- carried_container_slots(container_item_id, slot_x, slot_y) плюс
+-- idx_carried_slots_grid_covering с item_id — отдельные индексы им не нужны.
+CREATE INDEX IF NOT EXISTS idx_items_kind
+  ON items(kind_id);
@@ -0,0 +1,85 @@
+# tests/test_dao_queries.py
+# Сторож от N+1: считаем запросы, которые уходят в БД из горячих чтений DAO.
+import pytest
+from contextlib import asynccontextmanager
+from asyncpg.prepared_stmt import PreparedStatement
+from httpx import AsyncClient
+
+from app.dao import fetch_node, fetch_inventory
+from conftest import TestSessionLocal
+
+# служебные команды транзакции asyncpg шлёт сам — их не считаем
+_TX_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+@asynccontextmanager
+async def count_queries(session):
+    """
+    Собирает SQL, ушедший в БД по соединению сессии, на уровне драйвера:
+    каждый запрос — один раз, каким бы путём он ни шёл.
+      - Connection.fetch/fetchrow/execute (_pg_fetch) — через add_query_logger;
+      - подготовленные выражения (session.execute: SQLAlchemy исполняет их
+        через PreparedStatement, а query logger их не видит) — через обёртку
+        PreparedStatement на время блока.
+    """
+    conn = await session.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    queries = []
+
+    def _record(query):
+        if not query.lstrip().upper().startswith(_TX_PREFIXES):
+            queries.append(query)
+
+    def _on_raw(record):
+        _record(record.query)
+
+    orig_do_execute = PreparedStatement._PreparedStatement__do_execute
+
+    async def _do_execute(stmt, executor):
+        if stmt._connection is raw:
+            _record(stmt.get_query())
+        return await orig_do_execute(stmt, executor)
+
+    raw.add_query_logger(_on_raw)
+    PreparedStatement._PreparedStatement__do_execute = _do_execute
+    try:
+        yield queries
+    finally:
+        PreparedStatement._PreparedStatement__do_execute = orig_do_execute
+        raw.remove_query_logger(_on_raw)
+
+
+async def _seed_player_node(client: AsyncClient) -> str:
+    r = await client.post("/debug/seed_state", json={
+        "node_id": "forest_path_9596da",
+        "x": 5, "y": 5,
+        "actor_id": "player",
+    })
+    assert r.status_code == 200, r.text
+    r = await client.get("/debug/state")
+    assert r.status_code == 200, r.text
+    return r.json()["actor"]["node_id"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_node_single_query(client: AsyncClient):
+    nid = await _seed_player_node(client)
+
+    async with TestSessionLocal() as session:
+        # session.connection() открывает транзакцию — кэш fetch_node в ней не используется,
+        # так что запрос реально уходит в БД
+        async with count_queries(session) as q:
+            node = await fetch_node(session, nid)
+        assert node is not None
+        assert len(q) == 1, q
+
+
+@pytest.mark.asyncio
+async def test_fetch_inventory_single_query(client: AsyncClient):
+    await _seed_player_node(client)
+
+    async with TestSessionLocal() as session:
+        async with count_queries(session) as q:
+            inv = await fetch_inventory(session, "player")
+        assert "backpack_legacy" in inv
+        assert len(q) == 1, q
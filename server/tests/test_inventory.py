@@ -0,0 +1,99 @@
+# tests/test_inventory.py
+import uuid
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from conftest import TestSessionLocal
+
+
+@pytest_asyncio.fixture(scope="function")
+async def reload_setup(client: AsyncClient):
+    """
+    Свой актёр с оружием (1/6) в правой руке и двумя пачками в рюкзаке: 3 и 4 патрона.
+    Все id уникальны на прогон (свой тип патронов — чужие пачки в перезарядку не
+    попадут); после теста посеянное удаляется.
+    """
+    sfx = uuid.uuid4().hex[:8]
+    ids = {
+        "aid": f"reload_tester_{sfx}",
+        "gun_kind": f"test_reload_gun_{sfx}",
+        "ammo_kind": f"test_reload_ammo_{sfx}",
+        "ammo_type": f"test_reload_{sfx}",
+        "wid": str(uuid.uuid4()),
+        "p1": str(uuid.uuid4()),
+        "p2": str(uuid.uuid4()),
+    }
+
+    r = await client.post("/debug/seed_state", json={
+        "node_id": "forest_path_9596da",
+        "x": 7, "y": 7,
+        "actor_id": ids["aid"],
+    })
+    assert r.status_code == 200, r.text
+
+    try:
+        async with TestSessionLocal() as session:
+            await session.execute(text("""
+                insert into item_kinds (id, title, tags, handedness, ammo_type, max_charges)
+                values
+                  (:gun_kind,  'Тестовый пистолет', ARRAY['weapon'], 'one_hand', :ammo_type, 6),
+                  (:ammo_kind, 'Тестовые патроны',  ARRAY['ammo'],   'one_hand', :ammo_type, null)
+            """), ids)
+            await session.execute(text("""
+                insert into items (id, kind_id, charges)
+                values (CAST(:wid AS uuid), :gun_kind,  1),
+                       (CAST(:p1 AS uuid),  :ammo_kind, 3),
+                       (CAST(:p2 AS uuid),  :ammo_kind, 4)
+            """), ids)
+            await session.execute(text("""
+                update inventories
+                   set right_item = CAST(:wid AS uuid),
+                       backpack   = ARRAY[CAST(:p1 AS uuid), CAST(:p2 AS uuid)]
+                 where actor_id = :aid
+            """), ids)
+            await session.commit()
+
+        yield ids
+    finally:
+        async with TestSessionLocal() as session:
+            # строка inventories уходит каскадом вместе с актёром
+            await session.execute(text("delete from actors where id = :aid"), ids)
+            await session.execute(
+                text("delete from items where kind_id in (:gun_kind, :ammo_kind)"), ids
+            )
+            await session.execute(
+                text("delete from item_kinds where id in (:gun_kind, :ammo_kind)"), ids
+            )
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_reload_takes_packs_in_backpack_order(client: AsyncClient, reload_setup):
+    ids = reload_setup
+    aid = ids["aid"]
+
+    r = await client.post("/inventory/reload", json={"actor_id": aid, "hand": "right"})
+    assert r.status_code == 200, r.text
+    js = r.json()
+    assert js.get("ok") is True, js
+    # нужно 5: первая пачка уходит целиком (3), со второй снимается 2
+    assert js["loaded"] == 5
+    assert js["weapon_charges"] == 6
+    assert [(u["ammo_item_id"], u["taken"]) for u in js["used"]] == [(ids["p1"], 3), (ids["p2"], 2)]
+
+    async with TestSessionLocal() as session:
+        bp = (await session.execute(
+            text("select backpack from inventories where actor_id = :aid"), {"aid": aid}
+        )).scalar_one()
+        assert [str(x) for x in bp] == [ids["p2"]]
+        left = (await session.execute(
+            text("select id, charges from items where id = ANY(CAST(:ids AS uuid[]))"),
+            {"ids": [ids["p1"], ids["p2"]]},
+        )).all()
+        assert [(str(i), c) for i, c in left] == [(ids["p2"], 2)]
+
+    # магазин полон — повторная перезарядка ничего не снимает
+    r = await client.post("/inventory/reload", json={"actor_id": aid, "hand": "right"})
+    assert r.json() == {"ok": False, "error": "already_full", "left": 6}